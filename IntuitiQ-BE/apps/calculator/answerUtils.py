@@ -0,0 +1,70 @@
+import time
+from constants import PARSE_RETRIES
+from metrics import stage_seconds, timed
+from process_response import IncrementalParser, log_response, parse_response, parse_stats, unparsed_answer
+from providers.backends import Prompt
+
+
+class Solver:
+    """The provider round-trip shared by the text and image routes: ask, parse, retry and cache."""
+
+    def __init__(self, route: str, router, cache, with_assign: bool = False):
+        self.route = route
+        self.router = router
+        self.cache = cache
+        self.with_assign = with_assign
+
+    def parse_answers(self, response: str, with_problem: bool = False):
+        with timed(self.route, "parse"):
+            answers, outcome = parse_response(response, with_assign=self.with_assign, with_problem=with_problem)
+        log_response(self.route, response, answers, outcome)
+        return answers, outcome
+
+    def unparsed(self, response: str):
+        return unparsed_answer(response, with_assign=self.with_assign)
+
+    async def request_answers(self, prompt: Prompt, tier: str = "standard", retries: int = PARSE_RETRIES,
+                              with_problem: bool = False):
+        # Only ask again when the reply could not be parsed at all
+        for attempt in range(retries + 1):
+            if attempt:
+                parse_stats["retried"] += 1
+            with timed(self.route, "provider_call"):
+                content = await self.router.complete(prompt, tier)
+            answers, outcome = self.parse_answers(content, with_problem)
+            if answers is not None:
+                break
+        return answers, content, outcome
+
+    def store(self, key: str, answers: list, outcome: str):
+        # Repaired or result-less answers may be incomplete; they are returned but never kept for the cache TTL
+        if outcome != "repaired" and all(answer["result"].strip() for answer in answers):
+            self.cache.set(key, answers)
+
+    async def solve(self, prompt: Prompt, tier: str, key: str):
+        answers, content, outcome = await self.request_answers(prompt, tier)
+        if answers is None:
+            return self.unparsed(content)
+        self.store(key, answers, outcome)
+        return answers
+
+    async def stream_solve(self, prompt: Prompt, tier: str, key: str):
+        parser = IncrementalParser()
+        chunks = []
+        started = time.perf_counter()
+        async for delta in self.router.stream(prompt, tier):
+            chunks.append(delta)
+            yield "token", delta
+            for update in parser.feed(delta):
+                yield "steps", update
+        stage_seconds.observe(time.perf_counter() - started, route=self.route, stage="provider_stream")
+        content = "".join(chunks)
+        answers, outcome = self.parse_answers(content)
+        if answers is None and PARSE_RETRIES:
+            parse_stats["retried"] += 1
+            answers, content, outcome = await self.request_answers(prompt, tier, PARSE_RETRIES - 1)
+        if answers is None:
+            answers = self.unparsed(content)
+        else:
+            self.store(key, answers, outcome)
+        yield "result", answers
@@ -1,66 +1,228 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Optional
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import asyncio
 import base64
+import json
 from io import BytesIO
-from apps.calculator.imageUtils import analyze_image
-from PIL import Image
-from pymongo import MongoClient
+from apps.calculator.imageUtils import analyze_image, stream_image
+from apps.calculator.preprocessUtils import preprocess_canvas
+from blob_store import is_digest, make_thumbnail
 from datetime import datetime
-from pytz import timezone
-import os
-import dotenv
+from pytz import timezone, utc
 from bson import ObjectId
+from pagination import InvalidCursor, paginate_history
+from providers.router import NoBackendAvailable
+from history_writer import history_writer
+from metrics import timed
+import database
+from streaming import sse, SSE_HEADERS
+from constants import IMAGE_UPLOAD_MAX_BYTES
 
-dotenv.load_dotenv()
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["intuitiq"]
-collection = db["image_io_history"]
+COLLECTION = "image_io_history"
+UPLOAD_TYPES = ("image/png", "application/octet-stream")
 
 image_router = APIRouter()
 image_history_router = APIRouter()
 
+def history_collection():
+    return database.get_collection(COLLECTION)
+
 class ImageData(BaseModel):
     user_id: str
     image: str
     dict_of_vars: dict
 
-@image_router.post("")
-async def run(data: ImageData):
-    try:
-        image_data = base64.b64decode(data.image.split(",")[1])
-        image_bytes = BytesIO(image_data)
-        image = Image.open(image_bytes)
-        responses = analyze_image(image, dict_of_vars=data.dict_of_vars)
-        record = {
-            "user_id": data.user_id,
-            "image": data.image,
-            "dict_of_vars": data.dict_of_vars,
+def store_image(image_data: bytes, image):
+    blob_store = database.get_blob_store()
+    return blob_store.put(image_data), blob_store.put(make_thumbnail(image))
+
+def blob_url(ref: str):
+    return f"/image_history/blob/{ref}" if ref else None
+
+def save_history(user_id: str, dict_of_vars: dict, image_data: bytes, processed, responses, now: datetime):
+    # The blob uploads and the thumbnail encode happen after the response has been sent
+    def build_record():
+        with timed("image", "blob_store"):
+            image_ref, thumbnail_ref = store_image(image_data, processed.image)
+        return {
+            "user_id": user_id,
+            "image_ref": image_ref,
+            "thumbnail_ref": thumbnail_ref,
+            "dict_of_vars": dict_of_vars,
             "responses": responses,
-            "date": datetime.now(timezone("Asia/Kolkata")).strftime("%d/%m/%Y %H:%M:%S")
+            "date": now.astimezone(timezone("Asia/Kolkata")).strftime("%d/%m/%Y %H:%M:%S"),
+            "created_at": now.replace(tzinfo=None)
         }
-        collection.insert_one(record)
+    with timed("image", "history_write"):
+        history_writer.write_later(COLLECTION, build_record)
+
+def parse_vars(dict_of_vars: str):
+    try:
+        variables = json.loads(dict_of_vars)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"dict_of_vars is not valid JSON: {e}")
+    if not isinstance(variables, dict):
+        raise HTTPException(status_code=400, detail="dict_of_vars must be a JSON object")
+    return variables
+
+async def receive_canvas(request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in UPLOAD_TYPES:
+        raise HTTPException(status_code=415, detail="Send the canvas as an image/png request body")
+    too_large = HTTPException(status_code=413, detail=f"Canvas images are limited to {IMAGE_UPLOAD_MAX_BYTES} bytes")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > IMAGE_UPLOAD_MAX_BYTES:
+        raise too_large
+    # The body is written once into one buffer as it arrives. PIL cannot decode a PNG
+    # incrementally, so it is decoded from that buffer afterwards, without further copies
+    buffer = BytesIO()
+    with timed("image", "upload"):
+        async for chunk in request.stream():
+            if buffer.tell() + len(chunk) > IMAGE_UPLOAD_MAX_BYTES:
+                raise too_large
+            buffer.write(chunk)
+    if not buffer.tell():
+        raise HTTPException(status_code=400, detail="The request body is empty")
+    # getvalue() hands over the BytesIO's own buffer instead of copying it
+    return buffer.getvalue()
+
+async def solve_canvas(user_id: str, dict_of_vars: dict, image_data: bytes, processed, now: datetime):
+    try:
+        responses = await analyze_image(processed.image, dict_of_vars=dict_of_vars, encoded=processed.data)
+        save_history(user_id, dict_of_vars, image_data, processed, responses, now)
         return {
             "message": "Image problem processed successfully",
             "data": responses,
             "status": "success"
         }
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Image analysis timed out")
+    except NoBackendAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@image_router.post("")
+async def run(data: ImageData):
+    try:
+        now = datetime.now(utc)
+        with timed("image", "decode"):
+            image_data = base64.b64decode(data.image.split(",")[1])
+        processed = await asyncio.to_thread(preprocess_canvas, image_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    return await solve_canvas(data.user_id, data.dict_of_vars, image_data, processed, now)
+
+@image_router.post("/upload")
+async def run_upload(request: Request, user_id: str = Query(...), dict_of_vars: str = Query("{}")):
+    now = datetime.now(utc)
+    variables = parse_vars(dict_of_vars)
+    image_data = await receive_canvas(request)
+    try:
+        processed = await asyncio.to_thread(preprocess_canvas, image_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    return await solve_canvas(user_id, variables, image_data, processed, now)
+
+async def stream_solution(user_id: str, dict_of_vars: dict, image_data: bytes, processed, now: datetime):
+    responses = None
+    try:
+        async for kind, payload in stream_image(processed.image, dict_of_vars, encoded=processed.data):
+            if kind == "token":
+                yield sse("token", {"text": payload})
+            elif kind == "steps":
+                yield sse("steps", payload)
+            else:
+                responses = payload
+        save_history(user_id, dict_of_vars, image_data, processed, responses, now)
+    except asyncio.TimeoutError:
+        yield sse("error", {"detail": "Image analysis timed out"})
+        return
+    except Exception as e:
+        yield sse("error", {"detail": str(e)})
+        return
+    yield sse("result", {
+        "message": "Image problem processed successfully",
+        "data": responses,
+        "status": "success"
+    })
+
+@image_router.post("/stream")
+async def run_stream(data: ImageData):
+    try:
+        now = datetime.now(utc)
+        with timed("image", "decode"):
+            image_data = base64.b64decode(data.image.split(",")[1])
+        processed = await asyncio.to_thread(preprocess_canvas, image_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    return StreamingResponse(
+        stream_solution(data.user_id, data.dict_of_vars, image_data, processed, now),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@image_router.post("/upload/stream")
+async def run_upload_stream(request: Request, user_id: str = Query(...), dict_of_vars: str = Query("{}")):
+    now = datetime.now(utc)
+    variables = parse_vars(dict_of_vars)
+    image_data = await receive_canvas(request)
+    try:
+        processed = await asyncio.to_thread(preprocess_canvas, image_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    return StreamingResponse(
+        stream_solution(user_id, variables, image_data, processed, now),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+HISTORY_PROJECTION = {"_id": 1, "image_ref": 1, "thumbnail_ref": 1, "dict_of_vars": 1, "responses": 1, "date": 1}
+SUMMARY_PROJECTION = {"_id": 1, "thumbnail_ref": 1, "responses.expr": 1, "responses.result": 1, "date": 1}
+
 @image_history_router.get("")
-async def get_history(user_id: str = Query(...)):
+async def get_history(
+    user_id: str = Query(...),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    collection=Depends(history_collection),
+):
     try:
-        history = list(collection.find({"user_id": user_id}, {"_id": 1, "image": 1, "dict_of_vars": 1, "responses": 1, "date": 1}))
-        if not history:
+        projection = SUMMARY_PROJECTION if summary else HISTORY_PROJECTION
+        history, next_cursor = await asyncio.to_thread(paginate_history, collection, user_id, projection, limit, cursor)
+        if not history and not cursor:
             raise HTTPException(status_code=404, detail="No history found for this user")
         for entry in history:
             entry["_id"] = str(entry["_id"])
-        return {"history": history}
+            entry["image_url"] = blob_url(entry.pop("image_ref", None))
+            entry["thumbnail_url"] = blob_url(entry.pop("thumbnail_ref", None))
+        return {"history": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@image_history_router.get("/blob/{digest}")
+async def get_image_blob(digest: str, blob_store=Depends(database.get_blob_store)):
+    if not is_digest(digest):
+        raise HTTPException(status_code=400, detail="Invalid image reference")
+    blob = await asyncio.to_thread(blob_store.open, digest)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    chunks, content_type = blob
+    return StreamingResponse(
+        chunks,
+        media_type=content_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{digest}"'}
+    )
+
 @image_history_router.delete("/{entry_id}")
-async def delete_history_entry(entry_id: str):
+async def delete_history_entry(entry_id: str, collection=Depends(history_collection)):
     try:
         result = collection.delete_one({"_id": ObjectId(entry_id)})
         if result.deleted_count == 0:
@@ -70,7 +232,7 @@ async def delete_history_entry(entry_id: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @image_history_router.delete("/user/{user_id}")
-async def delete_all_user_image_history(user_id: str):
+async def delete_all_user_image_history(user_id: str, collection=Depends(history_collection)):
     try:
         result = collection.delete_many({"user_id": user_id})
         return {"message": f"Deleted {result.deleted_count} image history entries"}
@@ -0,0 +1,110 @@
+import logging
+from io import BytesIO
+from PIL import Image
+from constants import IMAGE_MAX_EDGE, IMAGE_CROP_PADDING, IMAGE_QUANTIZE, IMAGE_PALETTE_SIZE, CANVAS_SWATCHES
+from metrics import Collected, timed
+
+logger = logging.getLogger(__name__)
+
+# The canvas is drawn on a transparent PNG shown over a black page background
+BACKGROUND = (0, 0, 0)
+PALETTE_MIN_DISTANCE = 24
+
+preprocess_stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+Collected("intuitiq_preprocess_bytes_total", "Canvas bytes before and after preprocessing.", "counter", ("direction",), lambda: [
+    ({"direction": "in"}, preprocess_stats["bytes_in"]),
+    ({"direction": "out"}, preprocess_stats["bytes_out"]),
+])
+
+
+class PreprocessedImage:
+    def __init__(self, image: Image.Image, data: bytes, original_bytes: int, original_size: tuple):
+        self.image = image
+        self.data = data
+        self.mime_type = "image/png"
+        self.original_bytes = original_bytes
+        self.original_size = original_size
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+
+def hex_to_rgb(color: str):
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def flatten(img: Image.Image):
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, BACKGROUND + (255,))
+        return Image.alpha_composite(background, rgba).convert("RGB")
+    return img.convert("RGB")
+
+
+def crop_to_strokes(img: Image.Image, padding: int = IMAGE_CROP_PADDING):
+    bbox = img.getbbox()
+    if bbox is None:
+        return img
+    left, top, right, bottom = bbox
+    return img.crop((
+        max(0, left - padding),
+        max(0, top - padding),
+        min(img.width, right + padding),
+        min(img.height, bottom + padding),
+    ))
+
+
+def downscale(img: Image.Image, max_edge: int = IMAGE_MAX_EDGE):
+    if max(img.size) <= max_edge:
+        return img
+    scaled = img.copy()
+    scaled.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    return scaled
+
+
+def quantize(img: Image.Image, palette_size: int = IMAGE_PALETTE_SIZE):
+    # Keep the drawing colours exact: the palette is the canvas swatches plus the
+    # most frequent distinct colours in the image, so colour-coded strokes stay
+    # distinct and only anti-aliased edge pixels are snapped to a neighbour.
+    # Near-duplicate entries are skipped because PIL's palette lookup is not
+    # precise enough to tell them apart.
+    palette = [BACKGROUND] + [hex_to_rgb(c) for c in CANVAS_SWATCHES]
+    counts = img.getcolors(maxcolors=img.width * img.height) or []
+    added = 0
+    for _, color in sorted(counts, reverse=True):
+        if added >= palette_size or len(palette) >= 256:
+            break
+        if all(max(abs(a - b) for a, b in zip(color, entry)) > PALETTE_MIN_DISTANCE for entry in palette):
+            palette.append(color)
+            added += 1
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette([channel for color in palette for channel in color])
+    return img.quantize(palette=palette_image, dither=Image.Dither.NONE)
+
+
+def encode(img: Image.Image):
+    buffer = BytesIO()
+    img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def preprocess_canvas(raw: bytes):
+    with timed("image", "pil_open"):
+        img = Image.open(BytesIO(raw))
+        img.load()
+    original_size = img.size
+    with timed("image", "preprocess"):
+        img = downscale(crop_to_strokes(flatten(img)))
+        if IMAGE_QUANTIZE:
+            img = quantize(img)
+        processed = PreprocessedImage(img, encode(img), len(raw), original_size)
+    preprocess_stats["requests"] += 1
+    preprocess_stats["bytes_in"] += processed.original_bytes
+    preprocess_stats["bytes_out"] += len(processed.data)
+    logger.debug(
+        "Preprocessed image: %dx%d -> %dx%d, %d -> %d bytes (%d saved)",
+        *original_size, img.width, img.height, processed.original_bytes, len(processed.data), processed.bytes_saved
+    )
+    return processed
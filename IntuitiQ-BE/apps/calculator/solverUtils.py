@@ -0,0 +1,451 @@
+import math
+import re
+from fractions import Fraction
+from metrics import Collected
+
+MAX_INPUT_LENGTH = 200
+MAX_EXPONENT = 64
+MAX_DIGITS = 200
+MAX_SYSTEM_SIZE = 4
+MAX_POLY_DEGREE = 2
+MAX_POLY_TERMS = 16
+
+routing_stats = {"local": 0, "llm": 0}
+Collected("intuitiq_local_solver_total", "Text questions answered locally or sent to a provider.", "counter", ("route",), lambda: [
+    ({"route": route}, count) for route, count in routing_stats.items()
+])
+
+UNICODE_REPLACEMENTS = {
+    "×": "*", "÷": "/", "−": "-", "–": "-", "·": "*", "²": "^2", "³": "^3",
+}
+PREFIX_PATTERN = re.compile(r"^(?:q\.|question:|solve|evaluate|calculate|compute|simplify)\s*:?\s*", re.IGNORECASE)
+ALLOWED_PATTERN = re.compile(r"[\d\sa-zA-Z.+\-*/^()=,;]+")
+TOKEN_PATTERN = re.compile(r"\s*(?:(\d+\.?\d*|\.\d+)|([a-zA-Z])|(\*\*|[-+*/^()=]))")
+
+
+class Unsupported(Exception):
+    pass
+
+
+class Num:
+    def __init__(self, value: Fraction):
+        self.value = value
+
+
+class Var:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Neg:
+    def __init__(self, operand):
+        self.operand = operand
+
+
+class BinOp:
+    def __init__(self, op: str, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+def tokenize(text: str):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+        if not match:
+            raise Unsupported(f"Unexpected character at {pos}")
+        number, name, op = match.groups()
+        if number is not None:
+            tokens.append(("num", Fraction(number)))
+        elif name is not None:
+            tokens.append(("var", name))
+        else:
+            tokens.append(("op", "^" if op == "**" else op))
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, op):
+        kind, value = self.take()
+        if kind != "op" or value != op:
+            raise Unsupported(f"Expected '{op}'")
+
+    def parse(self):
+        node = self.expression()
+        if self.pos != len(self.tokens):
+            raise Unsupported("Trailing input")
+        return node
+
+    def expression(self):
+        node = self.term()
+        while self.peek() in (("op", "+"), ("op", "-")):
+            node = BinOp(self.take()[1], node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while True:
+            kind, value = self.peek()
+            if kind == "op" and value in ("*", "/"):
+                self.take()
+                node = BinOp(value, node, self.unary())
+            elif kind == "var" or (kind == "op" and value == "("):
+                node = BinOp("*", node, self.power())
+            else:
+                return node
+
+    def unary(self):
+        if self.peek() == ("op", "-"):
+            self.take()
+            return Neg(self.unary())
+        if self.peek() == ("op", "+"):
+            self.take()
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        base = self.atom()
+        if self.peek() == ("op", "^"):
+            self.take()
+            return BinOp("^", base, self.unary())
+        return base
+
+    def atom(self):
+        kind, value = self.take()
+        if kind == "num":
+            return Num(value)
+        if kind == "var":
+            return Var(value)
+        if (kind, value) == ("op", "("):
+            node = self.expression()
+            self.expect(")")
+            return node
+        raise Unsupported("Expected a number, variable or '('")
+
+
+def fmt_num(value: Fraction):
+    if value.denominator == 1:
+        return str(value.numerator)
+    return f"{value.numerator}/{value.denominator}"
+
+
+def fmt_operand(value: Fraction):
+    text = fmt_num(value)
+    return f"({text})" if value < 0 or value.denominator != 1 else text
+
+
+def fmt_result(value: Fraction):
+    if value.denominator == 1:
+        return str(value.numerator)
+    denominator = value.denominator
+    for factor in (2, 5):
+        while denominator % factor == 0:
+            denominator //= factor
+    decimal = f"{float(value):.4f}".rstrip("0").rstrip(".")
+    if denominator == 1 and len(decimal.split(".")[-1]) < 4:
+        return decimal
+    return f"{fmt_num(value)} ≈ {decimal}"
+
+
+def check_size(value: Fraction):
+    if len(str(value.numerator)) > MAX_DIGITS or len(str(value.denominator)) > MAX_DIGITS:
+        raise Unsupported("Number too large")
+    return value
+
+
+def apply_op(op: str, a: Fraction, b: Fraction):
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if op == "/":
+        if b == 0:
+            raise Unsupported("Division by zero")
+        return a / b
+    if b.denominator != 1 or abs(b) > MAX_EXPONENT or (a == 0 and b < 0):
+        raise Unsupported("Unsupported exponent")
+    return a ** int(b)
+
+
+def evaluate(node, steps: list):
+    if isinstance(node, Num):
+        return node.value
+    if isinstance(node, Neg):
+        return -evaluate(node.operand, steps)
+    if isinstance(node, BinOp):
+        a = evaluate(node.left, steps)
+        b = evaluate(node.right, steps)
+        value = check_size(apply_op(node.op, a, b))
+        steps.append(f"{fmt_operand(a)} {node.op} {fmt_operand(b)} = {fmt_num(value)}")
+        return value
+    raise Unsupported("Variables are not allowed in arithmetic")
+
+
+def poly_add(p: dict, q: dict, sign=1):
+    out = dict(p)
+    for mono, coef in q.items():
+        out[mono] = out.get(mono, 0) + sign * coef
+        if out[mono] == 0:
+            del out[mono]
+    return out
+
+
+def poly_mul(p: dict, q: dict):
+    out = {}
+    for m1, c1 in p.items():
+        for m2, c2 in q.items():
+            powers = dict(m1)
+            for var, exp in m2:
+                powers[var] = powers.get(var, 0) + exp
+            mono = tuple(sorted(powers.items()))
+            out[mono] = out.get(mono, 0) + c1 * c2
+            if out[mono] == 0:
+                del out[mono]
+    return out
+
+
+def poly_constant(p: dict):
+    if any(mono for mono in p):
+        return None
+    return p.get((), Fraction(0))
+
+
+def check_poly(p: dict):
+    # Every solvable shape is at most quadratic, so anything bigger is rejected
+    # as soon as it appears instead of after a nested power has expanded it.
+    if len(p) > MAX_POLY_TERMS or any(degree(mono) > MAX_POLY_DEGREE for mono in p):
+        raise Unsupported("Polynomial too large")
+    for coef in p.values():
+        check_size(coef)
+    return p
+
+
+def to_poly(node):
+    return check_poly(expand(node))
+
+
+def expand(node):
+    if isinstance(node, Num):
+        return {(): node.value} if node.value else {}
+    if isinstance(node, Var):
+        return {((node.name, 1),): Fraction(1)}
+    if isinstance(node, Neg):
+        return {mono: -coef for mono, coef in to_poly(node.operand).items()}
+    left = to_poly(node.left)
+    right = to_poly(node.right)
+    if node.op == "+":
+        return poly_add(left, right)
+    if node.op == "-":
+        return poly_add(left, right, -1)
+    if node.op == "*":
+        return poly_mul(left, right)
+    constant = poly_constant(right)
+    if node.op == "/":
+        if not constant:
+            raise Unsupported("Division by a variable or zero")
+        return {mono: coef / constant for mono, coef in left.items()}
+    if constant is None or constant.denominator != 1 or not 0 <= constant <= 10:
+        raise Unsupported("Unsupported exponent")
+    out = {(): Fraction(1)}
+    for _ in range(int(constant)):
+        out = check_poly(poly_mul(out, left))
+    return out
+
+
+def degree(mono):
+    return sum(exp for _, exp in mono)
+
+
+def fmt_mono(mono):
+    return "".join(var if exp == 1 else f"{var}^{exp}" for var, exp in mono)
+
+
+def fmt_poly(p: dict):
+    if not p:
+        return "0"
+    terms = sorted(p.items(), key=lambda item: (-degree(item[0]), item[0]))
+    out = ""
+    for mono, coef in terms:
+        sign = "-" if coef < 0 else "+"
+        magnitude = abs(coef)
+        body = fmt_mono(mono)
+        if not body:
+            text = fmt_num(magnitude)
+        elif magnitude == 1:
+            text = body
+        elif magnitude.denominator == 1:
+            text = f"{magnitude.numerator}{body}"
+        else:
+            text = f"({fmt_num(magnitude)}){body}"
+        out += (f"-{text}" if sign == "-" else text) if not out else f" {sign} {text}"
+    return out
+
+
+def split_square(n: int):
+    outside, inside, factor = 1, n, 2
+    while factor * factor <= inside and factor <= 10000:
+        while inside % (factor * factor) == 0:
+            inside //= factor * factor
+            outside *= factor
+        factor += 1
+    return outside, inside
+
+
+def fmt_surd(value: Fraction):
+    # sqrt(n/d) = sqrt(n*d)/d, with square factors pulled outside the root
+    outside, inside = split_square(value.numerator * value.denominator)
+    coef = Fraction(outside, value.denominator)
+    if inside == 1:
+        return fmt_num(coef)
+    root = f"√{inside}" if coef.numerator == 1 else f"{coef.numerator}√{inside}"
+    return root if coef.denominator == 1 else f"{root}/{coef.denominator}"
+
+
+def fmt_approx(value: float):
+    return f"{value:.4f}".rstrip("0").rstrip(".")
+
+
+def solve_single(poly: dict, var: str):
+    coeffs = {degree(mono): coef for mono, coef in poly.items()}
+    a2, a1, a0 = coeffs.get(2, Fraction(0)), coeffs.get(1, Fraction(0)), coeffs.get(0, Fraction(0))
+    steps = [f"Rewrite the equation in standard form: {fmt_poly(poly)} = 0"]
+    if a2 == 0:
+        if a1 == 0:
+            raise Unsupported("No variable term")
+        root = -a0 / a1
+        steps.append(f"Move the constant term to the right side: {fmt_poly({((var, 1),): a1})} = {fmt_num(-a0)}")
+        steps.append(f"Divide both sides by {fmt_operand(a1)}: {var} = {fmt_num(root)}")
+        return steps, f"{var} = {fmt_result(root)}"
+    disc = a1 * a1 - 4 * a2 * a0
+    center = -a1 / (2 * a2)
+    spread = disc / (4 * a2 * a2)
+    steps.append(f"Identify the coefficients: a = {fmt_num(a2)}, b = {fmt_num(a1)}, c = {fmt_num(a0)}")
+    steps.append(f"Compute the discriminant: D = b^2 - 4ac = {fmt_operand(a1)}^2 - 4 * {fmt_operand(a2)} * {fmt_operand(a0)} = {fmt_num(disc)}")
+    steps.append(f"Apply the quadratic formula: {var} = (-b ± √D) / 2a = ({fmt_num(-a1)} ± √{fmt_operand(disc)}) / {fmt_num(2 * a2)}")
+    if disc == 0:
+        steps.append(f"D = 0, so there is one repeated root: {var} = {fmt_num(center)}")
+        return steps, f"{var} = {fmt_result(center)}"
+    surd = fmt_surd(abs(spread))
+    if disc > 0:
+        if "√" not in surd:
+            roots = sorted({center + Fraction(surd), center - Fraction(surd)}, reverse=True)
+            steps.append(f"D > 0 and is a perfect square, so the roots are {var} = {fmt_num(roots[0])} and {var} = {fmt_num(roots[1])}")
+            return steps, ", ".join(f"{var} = {fmt_result(root)}" for root in roots)
+        exact = f"{var} = {fmt_num(center)} ± {surd}" if center else f"{var} = ±{surd}"
+        high = float(center) + math.sqrt(spread)
+        low = float(center) - math.sqrt(spread)
+        steps.append(f"D > 0, so there are two real roots: {exact}")
+        return steps, f"{exact} ({var} ≈ {fmt_approx(high)}, {var} ≈ {fmt_approx(low)})"
+    if surd == "1":
+        imaginary = "i"
+    else:
+        imaginary = f"({surd})i" if "√" in surd or "/" in surd else f"{surd}i"
+    exact = f"{var} = {fmt_operand(center)} ± {imaginary}" if center else f"{var} = ±{imaginary}"
+    steps.append(f"D < 0, so the roots are complex: {exact}")
+    return steps, exact
+
+
+def solve_linear_system(polys: list, names: list):
+    rows = []
+    for poly in polys:
+        if any(degree(mono) > 1 for mono in poly):
+            raise Unsupported("Non-linear system")
+        row = [poly.get(((name, 1),), Fraction(0)) for name in names]
+        row.append(-poly.get((), Fraction(0)))
+        rows.append(row)
+
+    def fmt_row(row):
+        lhs = fmt_poly({((name, 1),): coef for name, coef in zip(names, row) if coef})
+        return f"{lhs} = {fmt_num(row[-1])}"
+
+    steps = ["Write the system in standard form: " + ", ".join(fmt_row(row) for row in rows)]
+    size = len(names)
+    for col in range(size):
+        pivot = next((r for r in range(col, size) if rows[r][col] != 0), None)
+        if pivot is None:
+            raise Unsupported("System has no unique solution")
+        if pivot != col:
+            rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(size):
+            if r == col or rows[r][col] == 0:
+                continue
+            factor = rows[r][col] / rows[col][col]
+            rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+            steps.append(
+                f"Eliminate {names[col]} from equation {r + 1} by subtracting {fmt_operand(factor)} × equation {col + 1}: {fmt_row(rows[r])}"
+            )
+    values = [rows[i][-1] / rows[i][i] for i in range(size)]
+    steps.append("Divide each equation by its remaining coefficient: " + ", ".join(
+        f"{name} = {fmt_num(value)}" for name, value in zip(names, values)
+    ))
+    return steps, ", ".join(f"{name} = {fmt_result(value)}" for name, value in zip(names, values))
+
+
+def prepare(question: str):
+    text = question.strip()
+    for src, dst in UNICODE_REPLACEMENTS.items():
+        text = text.replace(src, dst)
+    text = PREFIX_PATTERN.sub("", text)
+    text = re.sub(r"\s*=?\s*\?$", "", text).strip()
+    if not text or len(text) > MAX_INPUT_LENGTH or not ALLOWED_PATTERN.fullmatch(text):
+        raise Unsupported("Not a plain expression")
+    if re.search(r"[a-zA-Z]{2,}", text):
+        raise Unsupported("Contains words")
+    return text
+
+
+def solve(question: str):
+    text = prepare(question)
+    parts = [part.strip() for part in re.split(r"[,;\n]", text) if part.strip()]
+    if len(parts) == 1 and "=" not in parts[0]:
+        steps = []
+        value = evaluate(Parser(tokenize(parts[0])).parse(), steps)
+        if not steps:
+            raise Unsupported("Nothing to calculate")
+        return steps, fmt_result(value)
+
+    polys = []
+    for part in parts:
+        sides = part.split("=")
+        if len(sides) != 2:
+            raise Unsupported("Each part must be a single equation")
+        lhs, rhs = (to_poly(Parser(tokenize(side)).parse()) for side in sides)
+        polys.append(poly_add(lhs, rhs, -1))
+    names = sorted({var for poly in polys for mono in poly for var, _ in mono})
+    if len(polys) == 1 and len(names) == 1:
+        if any(degree(mono) > 2 for mono in polys[0]):
+            raise Unsupported("Degree too high")
+        return solve_single(polys[0], names[0])
+    if 1 < len(names) == len(polys) <= MAX_SYSTEM_SIZE:
+        return solve_linear_system(polys, names)
+    raise Unsupported("Unsupported equation shape")
+
+
+def solve_locally(question: str):
+    try:
+        steps, result = solve(question)
+    except (Unsupported, ValueError, ZeroDivisionError, OverflowError, RecursionError):
+        routing_stats["llm"] += 1
+        return None
+    routing_stats["local"] += 1
+    steps_text = "\n".join(f"Step {i}: {step}" for i, step in enumerate(steps, 1))
+    return [{"expr": question.strip(), "steps": steps_text, "result": result}]
+
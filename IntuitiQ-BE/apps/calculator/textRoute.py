@@ -1,39 +1,59 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from pydantic import BaseModel
-from apps.calculator.textUtils import analyze_text
-from pymongo import MongoClient
+import asyncio
+from apps.calculator.textUtils import analyze_text, analyze_text_batch, stream_text
+from apps.calculator.solverUtils import solve_locally
 from datetime import datetime
-from pytz import timezone
-import os
-import dotenv
+from pytz import timezone, utc
 from bson import ObjectId
+from pagination import InvalidCursor, paginate_history
+from history_writer import history_writer
+from metrics import timed
+import database
+from streaming import sse, SSE_HEADERS
+from solution_cache import text_key
+from constants import BATCH_MAX_QUESTIONS
 
-dotenv.load_dotenv()
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["intuitiq"]
-collection = db["text_io_history"]
+COLLECTION = "text_io_history"
 
 text_router = APIRouter()
 text_history_router = APIRouter()
 
+def history_collection():
+    return database.get_collection(COLLECTION)
+
 class TextData(BaseModel):
     user_id: str
     question: str
 
+class BatchTextData(BaseModel):
+    user_id: str
+    questions: List[str]
+
+def build_record(user_id: str, question: str, responses, now: datetime):
+    return {
+        "user_id": user_id,
+        "input": question,
+        "responses": responses,
+        "date": now.astimezone(timezone("Asia/Kolkata")).strftime("%d/%m/%Y %H:%M:%S"),
+        "created_at": now.replace(tzinfo=None),
+    }
+
 @text_router.post("")
 async def solve_text_problem_route(data: TextData):
     try:
         question = data.question.strip()
         if not question:
             raise HTTPException(status_code=400, detail="Question cannot be empty")
-        responses = analyze_text(question)
-        record = {
-            "user_id": data.user_id,
-            "input": question,
-            "responses": responses,
-            "date": datetime.now(timezone("Asia/Kolkata")).strftime("%d/%m/%Y %H:%M:%S"),
-        }
-        collection.insert_one(record)
+        now = datetime.now(utc)
+        with timed("text", "local_solve"):
+            responses = solve_locally(question)
+        if responses is None:
+            responses = await analyze_text(question)
+        with timed("text", "history_write"):
+            await history_writer.write(COLLECTION, build_record(data.user_id, question, responses, now))
         return {
             "message": "Text problem solved successfully",
             "data": responses,
@@ -42,20 +62,111 @@ async def solve_text_problem_route(data: TextData):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_solution(user_id: str, question: str):
+    now = datetime.now(utc)
+    with timed("text", "local_solve"):
+        responses = solve_locally(question)
+    if responses is None:
+        async for kind, payload in stream_text(question):
+            if kind == "token":
+                yield sse("token", {"text": payload})
+            elif kind == "steps":
+                yield sse("steps", payload)
+            elif kind == "error":
+                yield sse("error", {"detail": payload})
+                return
+            else:
+                responses = payload
+    with timed("text", "history_write"):
+        await history_writer.write(COLLECTION, build_record(user_id, question, responses, now))
+    yield sse("result", {
+        "message": "Text problem solved successfully",
+        "data": responses,
+        "status": "success"
+    })
+
+@text_router.post("/stream")
+async def solve_text_problem_stream_route(data: TextData):
+    question = data.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    return StreamingResponse(stream_solution(data.user_id, question), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def is_error(responses):
+    return isinstance(responses, dict) and responses.get("status") == "error"
+
+@text_router.post("/batch")
+async def solve_text_batch_route(data: BatchTextData):
+    if not data.questions:
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(data.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions can be solved in one batch")
+    try:
+        now = datetime.now(utc)
+        questions = [question.strip() for question in data.questions]
+        unique = {}
+        for question in questions:
+            if question:
+                unique.setdefault(text_key(question), question)
+        solved = {}
+        remaining = []
+        for key, question in unique.items():
+            responses = solve_locally(question)
+            if responses is None:
+                remaining.append(key)
+            else:
+                solved[key] = responses
+        answers = await analyze_text_batch([unique[key] for key in remaining])
+        solved.update(zip(remaining, answers))
+
+        results = []
+        records = []
+        for index, question in enumerate(questions):
+            responses = solved.get(text_key(question)) if question else None
+            if responses is None:
+                results.append({"index": index, "question": question, "status": "error", "error": "Question cannot be empty"})
+            elif is_error(responses):
+                results.append({"index": index, "question": question, "status": "error", "error": responses["error"]})
+            else:
+                results.append({"index": index, "question": question, "status": "success", "data": responses})
+                records.append(build_record(data.user_id, question, responses, now))
+        await history_writer.write_many(COLLECTION, records)
+        return {
+            "message": "Text problems solved successfully",
+            "data": results,
+            "status": "success"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+HISTORY_PROJECTION = {"_id": 1, "input": 1, "responses": 1, "date": 1}
+SUMMARY_PROJECTION = {"_id": 1, "input": 1, "responses.result": 1, "date": 1}
+
 @text_history_router.get("")
-async def get_history(user_id: str = Query(...)):
+async def get_history(
+    user_id: str = Query(...),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    collection=Depends(history_collection),
+):
     try:
-        history = list(collection.find({"user_id": user_id },{"_id": 1, "input": 1, "responses": 1, "date": 1}))
-        if not history:
+        projection = SUMMARY_PROJECTION if summary else HISTORY_PROJECTION
+        history, next_cursor = await asyncio.to_thread(paginate_history, collection, user_id, projection, limit, cursor)
+        if not history and not cursor:
             raise HTTPException(status_code=404, detail="No history found for this user")
         for entry in history:
             entry["_id"] = str(entry["_id"])
-        return {"history": history}
+        return {"history": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @text_history_router.delete("/{entry_id}")
-async def delete_history_entry(entry_id: str):
+async def delete_history_entry(entry_id: str, collection=Depends(history_collection)):
     try:
         result = collection.delete_one({"_id": ObjectId(entry_id)})        
         if result.deleted_count == 0:
@@ -65,7 +176,7 @@ async def delete_history_entry(entry_id: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @text_history_router.delete("/user/{user_id}")
-async def delete_all_user_text_history(user_id: str):
+async def delete_all_user_text_history(user_id: str, collection=Depends(history_collection)):
     try:
         result = collection.delete_many({"user_id": user_id})
         return {"message": f"Deleted {result.deleted_count} image history entries"}
@@ -1,12 +1,15 @@
-from mistralai import Mistral
-from constants import MISTRAL_API_KEY
-import ast
+from apps.calculator.answerUtils import Solver
+from constants import PROVIDER_TIMEOUT, BATCH_PACK_SIZE, BATCH_MAX_CONCURRENCY, CHEAP_TIER
+from metrics import timed
+from providers.backends import Prompt
+from providers.router import create_router
+from single_flight import SingleFlight
+from solution_cache import SolutionCache, fingerprint, text_key
+import asyncio, logging, re
 
-if not MISTRAL_API_KEY:
-    raise ValueError("MISTRAL_API_KEY not found in environment variables.")
-
-client = Mistral(api_key=MISTRAL_API_KEY)
-model = "mistral-large-latest"
+router = create_router("text")
+flights = SingleFlight("text")
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = (
     f"You are an expert math tutor and solver and you have been given a text input that contains a mathematical expression, equation, or word-based math problem, and you need to solve them. "
@@ -66,35 +69,115 @@ SYSTEM_PROMPT = (
     f"DO NOT USE MARKDOWN OR BACKTICKS. FORMAT THE OUTPUT AS A LIST OF PROPERLY QUOTED PYTHON DICTIONARIES FOR EASY PARSING WITH ast.literal_eval. "
 )
 
-def analyze_text(question: str):
-    try:
-        chat_response = client.chat.complete(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": f"Problem: {question}\nSolve and return the answer as stated"
-                }
-            ],
-            temperature=0.3
-        )        
-        response = chat_response.choices[0].message.content
-        print(f"Raw Text Response: {response}")
-        answers = []
-        try:
-            answers = ast.literal_eval(response)
-        except Exception as e:
-            print(f"Error in parsing response from Mistral API: {e}")
-            answers = response
-        print(f"Processed Text Answer: {answers}")            
-        return answers
-        
-    except Exception as e:
+cache = SolutionCache("text", fingerprint(SYSTEM_PROMPT, *router.fingerprint()))
+solver = Solver("text", router, cache)
+
+def invalidate_cache():
+    cache.invalidate(fingerprint(SYSTEM_PROMPT, *router.fingerprint()))
+
+# Bare expressions with at most single-letter variables, e.g. "x^3 - 2x = 5", suit the cheap tier
+SIMPLE_QUESTION = re.compile(r"[0-9a-zA-Z\s+\-*/^().=,]{1,80}")
+
+def question_tier(question: str):
+    if CHEAP_TIER and SIMPLE_QUESTION.fullmatch(question) and not re.search(r"[a-zA-Z]{2,}", question):
+        return "cheap"
+    return "standard"
+
+def build_prompt(question: str):
+    with timed("text", "prompt_build"):
+        return Prompt(SYSTEM_PROMPT, f"Problem: {question}\nSolve and return the answer as stated")
+
+def build_batch_prompt(questions: list):
+    problems = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+    return Prompt(
+        SYSTEM_PROMPT,
+        f"Problems:\n{problems}\n"
+        f"Solve each of these {len(questions)} problems independently as stated. "
+        f"Return ONE list containing exactly {len(questions)} dicts, one per problem, "
+        f"in the same order as the problems are numbered. Do not merge or skip problems. "
+        f"Add a 'problem' key to each dict holding the number of the problem it answers."
+    )
+
+def error_response(e: Exception):
+    if isinstance(e, asyncio.TimeoutError):
         return {
             "status": "error",
-            "error": str(e)
+            "error": f"The text solver did not respond within {PROVIDER_TIMEOUT:g} seconds"
         }
+    return {
+        "status": "error",
+        "error": str(e)
+    }
+
+async def analyze_text(question: str):
+    key = text_key(question)
+    cached = await cache.get(key)
+    if cached is not None:
+        return cached
+    return await flights.run(key, lambda: solve_text(question, key))
+
+async def solve_text(question: str, key: str):
+    try:
+        return await solver.solve(build_prompt(question), question_tier(question), key)
+    except Exception as e:
+        return error_response(e)
+
+async def stream_text(question: str):
+    key = text_key(question)
+    cached = await cache.get(key)
+    if cached is not None:
+        yield "result", cached
+        return
+    # An identical solve already running is shared instead of streaming a second one
+    start = lambda: solver.stream_solve(build_prompt(question), question_tier(question), key)
+    try:
+        async for event in flights.stream(key, start):
+            yield event
+    except Exception as e:
+        yield "error", error_response(e)["error"]
+
+def order_by_problem(answers: list, count: int):
+    """Answers in problem order, or None unless each problem number 1..count was answered exactly once."""
+    by_problem = {answer.pop("problem"): answer for answer in answers}
+    if len(answers) != count or set(by_problem) != set(range(1, count + 1)):
+        return None
+    return [by_problem[number] for number in range(1, count + 1)]
+
+async def analyze_packed(questions: list):
+    try:
+        answers, _, outcome = await solver.request_answers(build_batch_prompt(questions), retries=0, with_problem=True)
+    except Exception as e:
+        logger.warning("Packed request for %d problems failed: %s", len(questions), e)
+        answers = outcome = None
+    # Match answers by the problem number the model echoed, never by position, before they reach the cache
+    ordered = order_by_problem(answers, len(questions)) if answers is not None else None
+    if ordered is not None:
+        for question, answer in zip(questions, ordered):
+            solver.store(text_key(question), [answer], outcome)
+        return [[answer] for answer in ordered]
+    # The model did not return one numbered answer per problem, so ask for each separately
+    return await asyncio.gather(*(analyze_text(question) for question in questions))
+
+async def analyze_text_batch(questions: list):
+    results = [None] * len(questions)
+    pending = []
+    for i, question in enumerate(questions):
+        cached = await cache.get(text_key(question))
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+    limiter = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def solve_pack(indexes):
+        async with limiter:
+            if len(indexes) == 1:
+                answers = [await analyze_text(questions[indexes[0]])]
+            else:
+                answers = await analyze_packed([questions[i] for i in indexes])
+        for i, answer in zip(indexes, answers):
+            results[i] = answer
+
+    packs = [pending[i:i + BATCH_PACK_SIZE] for i in range(0, len(pending), BATCH_PACK_SIZE)]
+    await asyncio.gather(*(solve_pack(pack) for pack in packs))
+    return results
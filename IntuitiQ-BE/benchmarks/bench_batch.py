@@ -0,0 +1,91 @@
+"""Worksheet solving: serial /text_calculate calls versus /text_calculate/batch.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_batch --size 50 --first-token 0.8
+
+A worksheet is drawn from benchmarks/corpus/text_questions.txt, with
+repeats, so it mixes locally solvable problems, LLM-bound problems and
+duplicates. Provider calls go to a stub whose latency grows with the number of
+answers it writes. The solution cache is cleared before each run.
+
+With ``--structured-gemini`` the questions go to a stub that answers like
+Gemini under its response schema instead, and the run fails unless packed
+batches still save provider calls there.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import mongomock
+import database
+import main
+from apps.calculator import textUtils
+from providers import backends
+from benchmarks.stubs import CANNED_TEXT, StubGemini, StubMistral, StubProvider, asgi_request, json_body
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "text_questions.txt")
+
+
+async def run(args):
+    database.connect(mongomock.MongoClient())
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    worksheet = random.Random(0).choices(corpus, k=args.size)
+
+    provider = StubProvider(CANNED_TEXT, args.first_token, args.interval, args.chunks)
+    if args.structured_gemini:
+        backends.clients["mistral"] = None
+        backends.clients["gemini"] = StubGemini(provider, structured=True)
+    else:
+        backends.clients["mistral"] = StubMistral(provider)
+        backends.clients["gemini"] = None
+
+    textUtils.cache.invalidate()
+    provider.calls = 0
+    start = time.perf_counter()
+    for question in worksheet:
+        result = await asgi_request(main.app, "POST", "/text_calculate", json_body({"user_id": "bench", "question": question}))
+        assert result["status"] == 200
+    serial = (time.perf_counter() - start, provider.calls)
+
+    textUtils.cache.invalidate()
+    provider.calls = 0
+    start = time.perf_counter()
+    result = await asgi_request(main.app, "POST", "/text_calculate/batch", json_body({"user_id": "bench", "questions": worksheet}))
+    assert result["status"] == 200, result["body"][:300]
+    items = json.loads(result["body"])["data"]
+    batch = (time.perf_counter() - start, provider.calls)
+
+    failed = sum(item["status"] != "success" for item in items)
+    print(f"worksheet: {args.size} questions, {len(set(worksheet))} distinct, {failed} failed in batch")
+    print(f"{'mode':<8} {'wall clock':>11} {'provider calls':>15}")
+    print(f"{'serial':<8} {serial[0]:>9.2f} s {serial[1]:>15}")
+    print(f"{'batch':<8} {batch[0]:>9.2f} s {batch[1]:>15}")
+    if batch[1] >= serial[1]:
+        print("FAILED: packed batches did not save provider calls")
+        return False
+    return True
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50)
+    parser.add_argument("--first-token", type=float, default=0.8)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--chunks", type=int, default=30)
+    parser.add_argument("--structured-gemini", action="store_true")
+    ok = asyncio.run(run(parser.parse_args()))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
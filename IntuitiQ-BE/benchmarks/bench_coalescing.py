@@ -0,0 +1,86 @@
+"""Concurrency check for single-flight coalescing of identical solves.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_coalescing --clients 30 --first-token 1.0
+
+A class of ``--clients`` students submits the same exercise at once, to each
+endpoint in turn, against a deliberately slow stub provider. Every endpoint
+must make exactly one provider call, answer every client and write one history
+record per client. The script exits non-zero if any of that does not hold.
+"""
+import argparse
+import asyncio
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import mongomock
+import mongomock.gridfs
+import database
+import main
+from apps.calculator import imageUtils, textUtils
+from benchmarks.canvases import sample_canvases
+from benchmarks.stubs import CANNED_IMAGE, CANNED_TEXT, StubGemini, StubMistral, StubProvider, asgi_request, json_body
+from history_writer import history_writer
+from providers import backends
+
+
+async def class_submits(path, body, clients):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(asgi_request(main.app, "POST", path, body) for _ in range(clients)))
+    return time.perf_counter() - start, results
+
+
+async def run(args):
+    mongomock.gridfs.enable_gridfs_integration()
+    database.connect(mongomock.MongoClient())
+    text_provider = StubProvider(CANNED_TEXT, args.first_token, 0.01, 10)
+    image_provider = StubProvider(CANNED_IMAGE, args.first_token, 0.01, 10)
+    backends.clients["mistral"] = StubMistral(text_provider)
+    backends.clients["gemini"] = StubGemini(image_provider)
+    # Hedging would add provider calls of its own and muddy the count
+    textUtils.router.hedging = False
+    imageUtils.router.hedging = False
+
+    canvas = "data:image/png;base64," + base64.b64encode(sample_canvases()["expression"]).decode()
+    cases = (
+        ("/text_calculate", text_provider, "text_io_history", {"question": "Probability of two heads in two coin tosses"}),
+        ("/text_calculate/stream", text_provider, "text_io_history", {"question": "Probability of at least one six in two dice rolls"}),
+        ("/image_calculate", image_provider, "image_io_history", {"image": canvas, "dict_of_vars": {"x": 1}}),
+        ("/image_calculate/stream", image_provider, "image_io_history", {"image": canvas, "dict_of_vars": {"x": 2}}),
+    )
+    ok = True
+    print(f"{'endpoint':<26} {'clients':>8} {'provider calls':>15} {'history records':>16} {'wall clock':>11}")
+    for path, provider, collection, payload in cases:
+        database.get_collection(collection).delete_many({})
+        provider.calls = 0
+        elapsed, results = await class_submits(path, json_body({"user_id": "bench", **payload}), args.clients)
+        # Image records are written after the response, once their blobs are stored
+        await history_writer.wait_pending()
+        records = database.get_collection(collection).count_documents({})
+        answered = sum(result["status"] == 200 for result in results)
+        print(f"{path:<26} {args.clients:>8} {provider.calls:>15} {records:>16} {elapsed:>9.2f} s")
+        if provider.calls != 1 or records != args.clients or answered != args.clients:
+            print(f"  FAILED: expected 1 provider call, {args.clients} answers and {args.clients} history records")
+            ok = False
+    print(f"coalescing: text {textUtils.flights.stats}, image {imageUtils.flights.stats}")
+    await history_writer.stop()
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=30)
+    parser.add_argument("--first-token", type=float, default=1.0)
+    ok = asyncio.run(run(parser.parse_args()))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
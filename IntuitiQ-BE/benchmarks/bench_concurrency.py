@@ -0,0 +1,79 @@
+"""Load test for the solve path with a fake Mistral client.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_concurrency --latency 0.5 --requests 64
+
+The fake client sleeps for ``--latency`` seconds per call, so throughput should
+scale with concurrency until MISTRAL_MAX_CONCURRENCY is reached. ``--blocking``
+simulates the old synchronous client call for comparison.
+
+Every request asks a different question and the solution cache is turned off,
+so each one reaches the fake client instead of a cached or coalesced answer.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ["SOLUTION_CACHE_SIZE"] = "0"
+os.environ["SOLUTION_CACHE_PATH"] = ""
+
+from apps.calculator import textUtils
+from providers import backends
+
+CANNED = "[{'expr': '2 + 3 * 4', 'steps': '3 * 4 => 12, 2 + 12 = 14', 'result': '14'}]"
+
+
+class FakeChat:
+    def __init__(self, latency, blocking):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def complete_async(self, **kwargs):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content=CANNED)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+async def run_level(concurrency, total):
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(f"{concurrency} + {i} * 4")
+
+    async def worker():
+        while not queue.empty():
+            question = queue.get_nowait()
+            await textUtils.analyze_text(question)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument("--blocking", action="store_true")
+    args = parser.parse_args()
+
+    backends.clients["mistral"] = SimpleNamespace(chat=FakeChat(args.latency, args.blocking))
+    textUtils.router.hedging = False
+    print(f"{'concurrency':>12} {'seconds':>10} {'req/s':>10}")
+    for level in (int(x) for x in args.levels.split(",")):
+        elapsed = await run_level(level, args.requests)
+        print(f"{level:>12} {elapsed:>10.2f} {args.requests / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
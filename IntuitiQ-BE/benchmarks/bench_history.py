@@ -0,0 +1,110 @@
+"""History query latency on a seeded collection.
+
+Run from IntuitiQ-BE/ against a local mongod (MONGO_URI, default
+mongodb://localhost:27017); the benchmark uses its own database and drops it
+when done:
+
+    python -m benchmarks.bench_history --docs 100000 --users 50
+
+It compares the old unbounded ``list(find({"user_id": ...}))`` read with the
+first and a deep page of the cursor-paginated read, with and without the
+(user_id, created_at) index. ``--mongomock`` runs the same code in memory for a
+quick smoke test; its timings do not reflect a real server.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from pagination import HISTORY_INDEX, ensure_history_index, paginate_history
+
+PROJECTION = {"_id": 1, "input": 1, "responses": 1, "date": 1}
+SUMMARY = {"_id": 1, "input": 1, "responses.result": 1, "date": 1}
+STEPS = "Step 1: Identify the value of a, b, c\nStep 2: Compute the discriminant\nStep 3: Apply the formula\n" * 4
+
+
+def seed(collection, docs, users):
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1)
+    batch = []
+    for i in range(docs):
+        created_at = start + timedelta(seconds=rng.randint(0, 3600 * 24 * 365))
+        batch.append({
+            "user_id": f"user_{rng.randrange(users)}",
+            "input": f"{rng.randint(1, 99)}x^2 + {rng.randint(1, 99)}x + {rng.randint(1, 99)} = 0",
+            "responses": [{"expr": "...", "steps": STEPS, "result": "x = ..."}],
+            "date": created_at.strftime("%d/%m/%Y %H:%M:%S"),
+            "created_at": created_at,
+        })
+        if len(batch) == 5000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1e3, result
+
+
+def deep_page(collection, user_id, pages):
+    cursor = None
+    for _ in range(pages):
+        _, cursor = paginate_history(collection, user_id, PROJECTION, 20, cursor)
+        if cursor is None:
+            break
+    return cursor
+
+
+def run_suite(collection, users, repeat, label):
+    user_ids = [f"user_{i}" for i in range(min(users, 10))]
+    rows = [
+        ("full list (old)", lambda u: list(collection.find({"user_id": u}, PROJECTION))),
+        ("first page, 20", lambda u: paginate_history(collection, u, PROJECTION, 20)),
+        ("first page, summary", lambda u: paginate_history(collection, u, SUMMARY, 20)),
+        ("10th page, 20", lambda u: deep_page(collection, u, 10)),
+    ]
+    for name, fn in rows:
+        ms = sum(timed(lambda: fn(u), repeat)[0] for u in user_ids) / len(user_ids)
+        print(f"{label:<10} {name:<22} {ms:>9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongomock", action="store_true")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client["intuitiq_bench"]
+    collection = db["text_io_history"]
+    collection.drop()
+    try:
+        print(f"Seeding {args.docs} documents for {args.users} users...")
+        seed(collection, args.docs, args.users)
+        run_suite(collection, args.users, args.repeat, "no index")
+        ensure_history_index(collection)
+        run_suite(collection, args.users, args.repeat, "indexed")
+        if not args.mongomock:
+            plan = collection.find({"user_id": "user_0"}).sort([(k, v) for k, v in HISTORY_INDEX[1:]]).limit(21).explain()
+            print("Winning plan stage:", plan["queryPlanner"]["winningPlan"].get("stage"))
+    finally:
+        client.drop_database("intuitiq_bench")
+
+
+if __name__ == "__main__":
+    main()
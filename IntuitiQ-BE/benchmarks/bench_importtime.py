@@ -0,0 +1,101 @@
+"""Cold-start cost of importing the app, from ``python -X importtime``.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_importtime --runs 5 --check
+
+Each run imports ``main`` in a fresh interpreter and reads the cumulative
+import time that ``-X importtime`` reports for it and for the heavy packages
+below. Packages that are loaded lazily should be missing from the import; the
+warm-up column then shows what ``providers.backends.warm_up()`` pays for them
+later, off the request path. ``--check`` exits non-zero if any of them is
+imported with the app again. ``--output`` writes the medians as JSON.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use or by the lifespan warm-up, never by importing the app
+DEFERRED = ("google.genai", "mistralai", "pymongo", "gridfs", "uvicorn")
+WATCHED = ("fastapi", "pydantic", "PIL.Image", "bson") + DEFERRED
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+# Trees from before the lazy start have no warm_up(); they report no warm-up time
+WARM_UP = (
+    "import time, main\n"
+    "from providers import backends\n"
+    "start = time.perf_counter()\n"
+    "if hasattr(backends, 'warm_up'):\n"
+    "    backends.warm_up()\n"
+    "    print(time.perf_counter() - start)\n"
+)
+
+
+def environment():
+    env = dict(os.environ)
+    env.setdefault("MISTRAL_API_KEY", "benchmark")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    return env
+
+
+def import_once():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=environment(), capture_output=True, text=True, check=True
+    )
+    cumulative = {}
+    for match in LINE.finditer(result.stderr):
+        # A module is listed once, where it was first imported
+        cumulative.setdefault(match.group(4), int(match.group(2)) / 1000)
+    return cumulative
+
+
+def warm_up_once():
+    result = subprocess.run(
+        [sys.executable, "-c", WARM_UP], cwd=BACKEND_DIR, env=environment(), capture_output=True, text=True, check=True
+    )
+    lines = result.stdout.strip().splitlines()
+    return float(lines[-1]) * 1000 if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="fail if a deferred package is imported with the app")
+    parser.add_argument("--output", help="write the medians as JSON to this path")
+    args = parser.parse_args()
+
+    runs = [import_once() for _ in range(args.runs)]
+    warm_ups = [ms for ms in (warm_up_once() for _ in range(args.runs)) if ms is not None]
+    median = lambda name: statistics.median(run[name] for run in runs) if all(name in run for run in runs) else None
+    results = {
+        "main_ms": median("main"),
+        "modules_ms": {name: median(name) for name in WATCHED},
+        "warm_up_ms": statistics.median(warm_ups) if warm_ups else None,
+    }
+
+    print(f"import main: {results['main_ms']:.0f} ms (median of {args.runs})")
+    if results["warm_up_ms"] is not None:
+        print(f"providers.backends.warm_up(): {results['warm_up_ms']:.0f} ms, after the app is serving")
+    print(f"{'package':<16} {'cumulative ms':>14}")
+    for name, ms in results["modules_ms"].items():
+        print(f"{name:<16} {'not imported' if ms is None else f'{ms:.0f}':>14}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    eager = [name for name in DEFERRED if results["modules_ms"][name] is not None]
+    if args.check and eager:
+        print(f"FAILED: imported with the app: {', '.join(eager)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
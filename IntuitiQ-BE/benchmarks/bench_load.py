@@ -0,0 +1,323 @@
+"""Offline load test of the whole app against stub providers and a throwaway Mongo.
+
+Run from IntuitiQ-BE/ after ``pip install -r benchmarks/requirements.txt``:
+
+    python -m benchmarks.bench_load --concurrency 1,8,32 --requests 200 --output load.json
+    python -m benchmarks.bench_load --concurrency 1,8,32 --requests 200 --compare load.json
+
+The app is driven in-process over ASGI with its lifespan running, so the
+batched history writer, the solution cache and single-flight coalescing behave
+as they do when deployed. Mistral and Gemini are replaced by the stubs in
+benchmarks/stubs.py. Requests replay benchmarks/corpus/text_questions.txt and
+the sample canvases (or the PNGs in ``--canvas-dir``) in a seeded mix of
+endpoints set by ``--mix``.
+
+History goes to mongomock, or with ``--mongo-uri`` to a local mongod, in the
+``--mongo-db`` database, which is dropped afterwards.
+
+Each concurrency level reports throughput, p50/p95/p99 of total time and time
+to first byte per endpoint, errors, provider calls, memory and the mean time of
+every solve stage from intuitiq_stage_seconds. ``--output`` writes the same
+numbers as JSON with the commit and settings; ``--compare`` prints the change
+against an earlier results file.
+
+The solution cache is off unless ``--warm-cache`` is given, so repeated corpus
+entries still reach the provider.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+CORPUS = os.path.join(BACKEND_DIR, "benchmarks", "corpus", "text_questions.txt")
+
+ENDPOINTS = {
+    "text": "/text_calculate",
+    "text_stream": "/text_calculate/stream",
+    "text_batch": "/text_calculate/batch",
+    "image": "/image_calculate",
+    "image_stream": "/image_calculate/stream",
+}
+DEFAULT_MIX = "text=5,text_stream=3,text_batch=1,image=2,image_stream=2"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "."], cwd=BACKEND_DIR).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def parse_mix(spec: str):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r} in --mix; choose from {', '.join(ENDPOINTS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def load_canvases(canvas_dir):
+    if canvas_dir:
+        canvases = {}
+        for name in sorted(os.listdir(canvas_dir)):
+            if name.lower().endswith(".png"):
+                with open(os.path.join(canvas_dir, name), "rb") as f:
+                    canvases[name] = f.read()
+        if not canvases:
+            raise SystemExit(f"No PNG files in {canvas_dir}")
+        return canvases
+    from benchmarks.canvases import sample_canvases
+    return sample_canvases()
+
+
+def workload(args, count, rng):
+    """Pre-encode ``count`` request bodies so building them is not timed."""
+    from benchmarks.stubs import json_body
+
+    with open(CORPUS, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    canvases = ["data:image/png;base64," + base64.b64encode(png).decode() for png in load_canvases(args.canvas_dir).values()]
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    requests = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        if name == "text_batch":
+            payload = {"questions": rng.sample(questions, min(args.batch_size, len(questions)))}
+        elif name.startswith("text"):
+            payload = {"question": rng.choice(questions)}
+        else:
+            payload = {"image": rng.choice(canvases), "dict_of_vars": {}}
+        requests.append((name, json_body({"user_id": f"load_{rng.randrange(args.users)}", **payload})))
+    return requests
+
+
+def stage_totals():
+    import metrics
+    with metrics.stage_seconds.lock:
+        return {f"{route}.{stage}": (total, count) for (route, stage), (_, total, count) in metrics.stage_seconds.values.items()}
+
+
+async def run_level(app, requests, concurrency, providers):
+    from benchmarks.stubs import asgi_request
+
+    results = []
+    pending = iter(requests)
+    calls_before = {name: provider.calls for name, provider in providers.items()}
+    stages_before = stage_totals()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+    async def worker():
+        for name, body in pending:
+            result = await asgi_request(app, "POST", ENDPOINTS[name], body)
+            # Streams answer 200 up front and report failures as an SSE error event
+            failed = result["status"] != 200 or b"event: error" in result["body"]
+            results.append((name, failed, result["total"], result["ttfb"] or result["total"]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name in ENDPOINTS:
+        rows = [row for row in results if row[0] == name]
+        if not rows:
+            continue
+        totals, ttfbs = [row[2] for row in rows], [row[3] for row in rows]
+        endpoints[name] = {
+            "count": len(rows),
+            "errors": sum(row[1] for row in rows),
+            **{f"p{pct}_ms": round(percentile(totals, pct) * 1000, 1) for pct in (50, 95, 99)},
+            **{f"ttfb_p{pct}_ms": round(percentile(ttfbs, pct) * 1000, 1) for pct in (50, 95, 99)},
+        }
+    stages = {}
+    for stage, (total, count) in sorted(stage_totals().items()):
+        before_total, before_count = stages_before.get(stage, (0.0, 0))
+        if count > before_count:
+            stages[stage] = {"count": count - before_count, "mean_ms": round((total - before_total) / (count - before_count) * 1000, 2)}
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "errors": sum(row[1] for row in results),
+        "provider_calls": {name: provider.calls - calls_before[name] for name, provider in providers.items()},
+        "rss_mb": round(rss_mb() or 0, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "heap_peak_mb": round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1) if tracemalloc.is_tracing() else None,
+        "endpoints": endpoints,
+        "stages": stages,
+    }
+
+
+def print_level(level):
+    print(
+        f"\nconcurrency {level['concurrency']}: {level['requests']} requests in {level['seconds']:.2f} s, "
+        f"{level['throughput_rps']:.1f} req/s, {level['errors']} errors, provider calls {level['provider_calls']}, "
+        f"RSS {level['rss_mb']} MB (peak {level['peak_rss_mb']} MB)"
+        + (f", heap peak {level['heap_peak_mb']} MB" if level["heap_peak_mb"] is not None else "")
+    )
+    print(f"  {'endpoint':<14} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttfb p50':>9} {'ttfb p95':>9} {'ttfb p99':>9}")
+    for name, row in level["endpoints"].items():
+        print(
+            f"  {name:<14} {row['count']:>6} {row['errors']:>6} {row['p50_ms']:>8.0f} {row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} "
+            f"{row['ttfb_p50_ms']:>9.0f} {row['ttfb_p95_ms']:>9.0f} {row['ttfb_p99_ms']:>9.0f}"
+        )
+    print(f"  {'stage':<28} {'count':>6} {'mean ms':>9}")
+    for stage, row in level["stages"].items():
+        print(f"  {stage:<28} {row['count']:>6} {row['mean_ms']:>9.2f}")
+
+
+def change(old, new):
+    if not old:
+        return "     n/a"
+    return f"{(new - old) / old * 100:>+7.1f}%"
+
+
+def print_comparison(baseline, results):
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'}:")
+    print(f"  {'level':>5} {'endpoint':<14} {'metric':<10} {'before':>9} {'after':>9} {'change':>8}")
+    old_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in results["levels"]:
+        old = old_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        print(f"  {level['concurrency']:>5} {'all':<14} {'req/s':<10} {old['throughput_rps']:>9.1f} {level['throughput_rps']:>9.1f} {change(old['throughput_rps'], level['throughput_rps'])}")
+        for name, row in level["endpoints"].items():
+            old_row = old["endpoints"].get(name)
+            if old_row is None:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                print(f"  {level['concurrency']:>5} {name:<14} {metric:<10} {old_row[metric]:>9.0f} {row[metric]:>9.0f} {change(old_row[metric], row[metric])}")
+
+
+async def run(args):
+    if not args.warm_cache:
+        os.environ["SOLUTION_CACHE_SIZE"] = "0"
+        os.environ["SOLUTION_CACHE_PATH"] = ""
+    os.environ["MONGO_DB"] = args.mongo_db
+    # The app reads its settings at import, so it is imported only once they are in place
+    import database
+    import main
+    from apps.calculator import imageUtils, textUtils
+    from benchmarks.stubs import CANNED_IMAGE, CANNED_TEXT, StubGemini, StubMistral, StubProvider
+    from providers import backends
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        database.connect(MongoClient(args.mongo_uri))
+    else:
+        import mongomock
+        import mongomock.gridfs
+        mongomock.gridfs.enable_gridfs_integration()
+        database.connect(mongomock.MongoClient())
+
+    providers = {
+        "text": StubProvider(CANNED_TEXT, args.first_token, args.interval, args.chunks, args.jitter, seed=args.seed),
+        "image": StubProvider(CANNED_IMAGE, args.first_token, args.interval, args.chunks, args.jitter, seed=args.seed + 1),
+    }
+    backends.clients["mistral"] = StubMistral(providers["text"])
+    backends.clients["gemini"] = StubGemini(providers["image"])
+    if args.no_hedging:
+        textUtils.router.hedging = False
+        imageUtils.router.hedging = False
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    rng = random.Random(args.seed)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "levels": [],
+    }
+    async with main.app.router.lifespan_context(main.app):
+        try:
+            if args.warmup:
+                await run_level(main.app, workload(args, args.warmup, rng), min(args.warmup, levels[0]), providers)
+            for concurrency in levels:
+                level = await run_level(main.app, workload(args, args.requests, rng), concurrency, providers)
+                results["levels"].append(level)
+                print_level(level)
+        finally:
+            database.connect().drop_database(args.mongo_db)
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests before the first level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. text=1,image=1")
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--canvas-dir", help="directory of canvas PNGs to replay instead of the samples")
+    parser.add_argument("--first-token", type=float, default=0.8)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--chunks", type=int, default=30)
+    parser.add_argument("--jitter", type=float, default=0.3, help="log-normal sigma of the first-token latency")
+    parser.add_argument("--no-hedging", action="store_true")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the solution cache on")
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock")
+    parser.add_argument("--mongo-db", default="intuitiq_bench_load")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the Python heap peak (slower)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+    sys.exit(1 if any(level["errors"] for level in results["levels"]) else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
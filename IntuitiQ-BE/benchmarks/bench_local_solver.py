@@ -0,0 +1,84 @@
+"""Routing hit rate and latency of the local solver on a question corpus.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_local_solver --llm-latency 3.0
+
+Questions the local solver cannot handle are charged ``--llm-latency`` seconds,
+the typical mistral-large-latest round-trip, to estimate the end-to-end effect.
+The run fails if any of the nested-power inputs in ``PATHOLOGICAL`` takes longer
+than ``--budget-ms`` to be rejected, since they are solved on the event loop.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.calculator import solverUtils
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "text_questions.txt")
+PATHOLOGICAL = (
+    "((a+b+c+d)^10)^10 = 1",
+    "(((x+1)^10)^10)^10 = 0",
+    "(x+y)^10 * (x+y)^10 = 1",
+    "(99999^10)^10 x = 1",
+)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--llm-latency", type=float, default=3.0)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    local_times = []
+    with_fast_path = []
+    for question in questions:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = solverUtils.solve_locally(question)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        if result is None:
+            with_fast_path.append(elapsed + args.llm_latency)
+        else:
+            local_times.append(elapsed)
+            with_fast_path.append(elapsed)
+        if args.verbose:
+            print(f"{'local' if result else 'llm':>5}  {question}  ->  {result[0]['result'] if result else ''}")
+
+    hits = len(local_times)
+    print(f"questions:            {len(questions)}")
+    print(f"routed locally:       {hits} ({hits / len(questions):.0%})")
+    if local_times:
+        print(f"local p50 / p95:      {percentile(local_times, 50) * 1e3:.3f} ms / {percentile(local_times, 95) * 1e3:.3f} ms")
+    print(f"mean latency, LLM only:    {args.llm_latency:.3f} s")
+    print(f"mean latency, fast path:   {statistics.mean(with_fast_path):.3f} s")
+
+    worst = 0.0
+    for question in PATHOLOGICAL:
+        start = time.perf_counter()
+        result = solverUtils.solve_locally(question)
+        worst = max(worst, time.perf_counter() - start)
+        if result is not None:
+            sys.exit(f"pathological input was solved locally: {question}")
+    print(f"pathological worst:   {worst * 1e3:.3f} ms")
+    if worst * 1e3 > args.budget_ms:
+        sys.exit(f"pathological input exceeded the {args.budget_ms} ms budget")
+
+
+if __name__ == "__main__":
+    main()
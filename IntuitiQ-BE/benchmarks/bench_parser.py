@@ -0,0 +1,183 @@
+"""Parse success rate and speed on real malformed LLM outputs.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_parser
+    python -m benchmarks.bench_parser --fuzz 5000
+
+Each corpus line holds a raw model reply and the answers it should parse to
+(null when nothing is recoverable). The legacy pipeline is the one the
+analyzers used before process_response.parse_response replaced it. ``--fuzz``
+mutates the well-formed replies and checks the parser never raises and never
+passes off a repaired reply, such as one cut off mid-steps, without a result.
+
+Every reply is also streamed through IncrementalParser in ``--chunk``-character
+pieces; the steps it reports must add up to the steps of the final parse.
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_response import ANSWER_FIELDS, IncrementalParser, parse_response, parse_stats
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "malformed_outputs.jsonl")
+
+
+def legacy_parse(response):
+    text = response.strip()
+    text = re.sub(r'^```json\s*', '', text)
+    text = re.sub(r'^```', '', text)
+    text = re.sub(r'```$', '', text)
+    try:
+        return ast.literal_eval(text)
+    except Exception:
+        pass
+
+    def between(start_substring, end_substring):
+        start_index = text.find(start_substring)
+        if start_index == -1:
+            return None
+        start_index += len(start_substring)
+        end_index = text.find(end_substring, start_index)
+        return None if end_index == -1 else text[start_index:end_index]
+
+    return [{
+        'expr': between("'expr': '", "', 'steps': "),
+        'steps': between("', 'steps': '", "', 'result': "),
+        'result': between("', 'result': '", "'}]"),
+    }]
+
+
+def comparable(answers):
+    if not isinstance(answers, list) or not all(isinstance(a, dict) for a in answers):
+        return None
+    return [{field: str(a.get(field)) if a.get(field) is not None else None for field in ANSWER_FIELDS} for a in answers]
+
+
+def legacy_matches(case):
+    try:
+        answers = legacy_parse(case["raw"])
+    except Exception:
+        return False
+    if case["expected"] is None:
+        return False
+    return comparable(answers) == case["expected"]
+
+
+def new_matches(case):
+    answers, _ = parse_response(case["raw"])
+    return answers == case["expected"]
+
+
+def time_per_call(fn, cases, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            try:
+                fn(case["raw"])
+            except Exception:
+                pass
+    return (time.perf_counter() - start) / (repeat * len(cases)) * 1e6
+
+
+def stream_steps(raw, chunk):
+    parser = IncrementalParser()
+    steps = {}
+    for i in range(0, len(raw), chunk):
+        for update in parser.feed(raw[i:i + chunk]):
+            steps[update["index"]] = steps.get(update["index"], "") + update["steps"]
+    return steps
+
+
+def stream_matches(case, chunk):
+    answers, _ = parse_response(case["raw"])
+    if answers is None:
+        return True
+    expected = {i: answer["steps"] for i, answer in enumerate(answers)}
+    return all(expected.get(i, "").startswith(text) for i, text in stream_steps(case["raw"], chunk).items())
+
+
+MUTATIONS = (
+    lambda s, r: s.replace(", '", " '", 1),
+    lambda s, r: s.replace("'", '"'),
+    lambda s, r: s[:r.randint(len(s) // 2, len(s))],
+    lambda s, r: f"```python\n{s}\n```",
+    lambda s, r: f"Sure! Here is the answer:\n{s}\nHope this helps.",
+    lambda s, r: s.replace("Step 2", "Let's do step 2", 1),
+    lambda s, r: s.replace("\\n", "\n"),
+    lambda s, r: s.replace("}]", "},]"),
+    lambda s, r: s[:r.randrange(len(s))] + r.choice("'\"{}[],:") + s[r.randrange(len(s)):],
+)
+
+
+def fuzz(cases, rounds, seed):
+    rng = random.Random(seed)
+    seeds = [case for case in cases if case["expected"] is not None]
+    recovered = crashed = empty = 0
+    for _ in range(rounds):
+        case = rng.choice(seeds)
+        raw = case["raw"]
+        for mutate in rng.sample(MUTATIONS, rng.randint(1, 3)):
+            raw = mutate(raw, rng)
+        try:
+            answers, outcome = parse_response(raw)
+        except Exception as e:
+            crashed += 1
+            print(f"crash: {type(e).__name__}: {e}\n  input: {raw!r}")
+            continue
+        if answers is not None:
+            recovered += 1
+            if outcome == "repaired" and not all(answer["result"] for answer in answers):
+                empty += 1
+                print(f"repaired without a result: {raw!r}")
+    print(f"fuzz rounds: {rounds}, recovered: {recovered / rounds:.1%}, crashes: {crashed}, repaired without a result: {empty}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--fuzz", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=4)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    legacy_ok = new_ok = 0
+    for case in cases:
+        old, new = legacy_matches(case), new_matches(case)
+        legacy_ok += old
+        new_ok += new
+        if args.verbose:
+            print(f"{'ok' if old else '--':>6} {'ok' if new else '--':>6}  {case['name']}")
+    print(f"corpus cases: {len(cases)}")
+    print(f"legacy correct: {legacy_ok / len(cases):.1%}")
+    print(f"new correct:    {new_ok / len(cases):.1%}  {parse_stats}")
+    print(f"legacy us/parse: {time_per_call(legacy_parse, cases, args.repeat):.1f}")
+    print(f"new us/parse:    {time_per_call(parse_response, cases, args.repeat):.1f}")
+
+    stream_ok = sum(stream_matches(case, args.chunk) for case in cases)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for case in cases:
+            stream_steps(case["raw"], args.chunk)
+    per_kb = (time.perf_counter() - start) / (args.repeat * sum(len(case["raw"]) for case in cases)) * 1024 * 1e3
+    print(f"streamed steps consistent: {stream_ok}/{len(cases)}")
+    print(f"stream ms/KB at {args.chunk}-char chunks: {per_kb:.3f}")
+
+    if args.fuzz:
+        fuzz(cases, args.fuzz, args.seed)
+
+
+if __name__ == "__main__":
+    main()
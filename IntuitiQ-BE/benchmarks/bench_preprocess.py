@@ -0,0 +1,58 @@
+"""Upload size and preprocessing cost for sample canvases.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_preprocess --width 1920 --height 1080
+
+For each synthetic canvas this reports the raw PNG size, the preprocessed PNG
+that is sent to Gemini, the time spent preprocessing, and whether every swatch
+colour present in the input survived quantization.
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from apps.calculator import preprocessUtils
+from benchmarks.canvases import sample_canvases
+from constants import CANVAS_SWATCHES
+
+
+def swatch_colors(img):
+    swatches = {preprocessUtils.hex_to_rgb(color) for color in CANVAS_SWATCHES}
+    counts = img.convert("RGB").getcolors(maxcolors=img.width * img.height) or []
+    return {color for _, color in counts if color in swatches}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'canvas':<12} {'raw bytes':>10} {'sent bytes':>10} {'saved':>7} {'dims':>11} {'ms':>8} {'colours kept':>13}")
+    total_in = total_out = 0
+    for name, raw in sample_canvases(args.width, args.height).items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            processed = preprocessUtils.preprocess_canvas(raw)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        before = swatch_colors(preprocessUtils.flatten(Image.open(BytesIO(raw))))
+        after = swatch_colors(processed.image)
+        total_in += len(raw)
+        total_out += len(processed.data)
+        dims = f"{processed.image.width}x{processed.image.height}"
+        print(
+            f"{name:<12} {len(raw):>10} {len(processed.data):>10} {1 - len(processed.data) / len(raw):>7.0%} "
+            f"{dims:>11} {elapsed * 1e3:>8.1f} {len(before & after):>6}/{len(before):<6}"
+        )
+    print(f"{'total':<12} {total_in:>10} {total_out:>10} {1 - total_out / total_in:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Provider router behaviour under injected latency and faults.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_router --requests 400
+
+Every scenario routes requests across fake backends (providers/fakes.py):
+
+- tail: the primary is occasionally 10x slow. Compare hedging off and on.
+- outage: the primary always fails. The breaker should open, so traffic
+  fails over without paying the primary's latency each time.
+- rate_limit: the primary returns 429 on a third of calls. Retries with
+  jittered backoff should absorb them.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers.backends import Prompt
+from providers.fakes import FakeBackend
+from providers.router import ProviderRouter
+
+PROMPT = Prompt("system", "Problem: 2 + 3 * 4")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+SCENARIOS = {
+    "tail": lambda: [
+        FakeBackend("primary", latency=0.1, slow_rate=0.05, seed=1),
+        FakeBackend("backup", latency=0.15, seed=2),
+    ],
+    "outage": lambda: [
+        FakeBackend("primary", latency=0.3, failure_rate=1.0, seed=1),
+        FakeBackend("backup", latency=0.15, seed=2),
+    ],
+    "rate_limit": lambda: [
+        FakeBackend("primary", latency=0.1, rate_limit_rate=0.33, seed=1),
+        FakeBackend("backup", latency=0.15, seed=2),
+    ],
+}
+
+
+async def run(name, hedging, requests, concurrency):
+    router = ProviderRouter("text", SCENARIOS[name](), hedging=hedging)
+    latencies, failures = [], 0
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal failures
+        async with limiter:
+            start = time.perf_counter()
+            try:
+                await router.complete(PROMPT)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    calls = sum(backend.requests for backend in router.backends)
+    print(
+        f"{name:<11} {'on' if hedging else 'off':>7} {statistics.median(latencies) * 1000:>8.0f} "
+        f"{percentile(latencies, 95) * 1000:>8.0f} {percentile(latencies, 99) * 1000:>8.0f} "
+        f"{failures:>8} {calls / requests:>10.2f} {router.stats['hedged']:>7} {router.stats['failovers']:>9}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    args = parser.parse_args()
+
+    print(f"{'scenario':<11} {'hedging':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>8} {'calls/req':>10} {'hedged':>7} {'failovers':>9}")
+    for name in args.scenarios.split(","):
+        for hedging in (False, True):
+            await run(name, hedging, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Time-to-first-byte of the streaming solve endpoints against stub providers.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_ttfb --first-token 0.8 --interval 0.02
+
+Each question is unique and cannot be solved locally, so every request reaches
+the stub provider. History goes to an in-memory mongomock database.
+"""
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import mongomock
+import mongomock.gridfs
+import database
+import main
+from providers import backends
+from benchmarks.canvases import sample_canvases
+from benchmarks.stubs import CANNED_IMAGE, CANNED_TEXT, StubGemini, StubMistral, StubProvider, asgi_request, json_body
+
+
+async def measure(path, bodies):
+    ttfb, total = [], []
+    for body in bodies:
+        result = await asgi_request(main.app, "POST", path, body)
+        assert result["status"] == 200, result["body"][:200]
+        ttfb.append(result["ttfb"])
+        total.append(result["total"])
+    return statistics.median(ttfb), statistics.median(total)
+
+
+async def run(args):
+    mongomock.gridfs.enable_gridfs_integration()
+    database.connect(mongomock.MongoClient())
+    backends.clients["mistral"] = StubMistral(StubProvider(CANNED_TEXT, args.first_token, args.interval, args.chunks))
+    backends.clients["gemini"] = StubGemini(StubProvider(CANNED_IMAGE, args.first_token, args.interval, args.chunks))
+
+    def text_bodies(tag):
+        return [json_body({"user_id": "bench", "question": f"Probability question {tag} {i}"}) for i in range(args.requests)]
+
+    canvas = sample_canvases()["expression"]
+
+    def image_bodies(tag):
+        # A different dict_of_vars per request keeps the solution cache cold
+        url = "data:image/png;base64," + base64.b64encode(canvas).decode()
+        return [json_body({"user_id": "bench", "image": url, "dict_of_vars": {tag: i}}) for i in range(args.requests)]
+
+    print(f"{'endpoint':<26} {'median TTFB':>12} {'median total':>13}")
+    for label, path, bodies in (
+        ("/text_calculate", "/text_calculate", text_bodies("full")),
+        ("/text_calculate/stream", "/text_calculate/stream", text_bodies("stream")),
+        ("/image_calculate", "/image_calculate", image_bodies("full")),
+        ("/image_calculate/stream", "/image_calculate/stream", image_bodies("stream")),
+    ):
+        ttfb, total = await measure(path, bodies)
+        print(f"{label:<26} {ttfb * 1e3:>9.0f} ms {total * 1e3:>10.0f} ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--first-token", type=float, default=0.8)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--chunks", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
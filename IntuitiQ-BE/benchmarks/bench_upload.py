@@ -0,0 +1,146 @@
+"""Latency and memory of the JSON base64 canvas upload against the raw PNG upload.
+
+Run from IntuitiQ-BE/:
+
+    python -m benchmarks.bench_upload --repeat 10
+
+Every canvas is posted to ``/image_calculate`` as a base64 data URL in JSON and
+to ``/image_calculate/upload`` as a raw image/png body, both arriving in 64 KB
+chunks. The stub provider answers at once.
+
+"ingest" is everything until the PNG bytes reach preprocess_canvas: receiving
+the body and, on the JSON path, parsing it, validating it and decoding the
+base64. Its memory is the tracemalloc peak up to that point, i.e. the copies of
+the image the app holds before decoding it, plus on both paths the benchmark's
+own chunked copy of the body. The "total" columns cover the
+whole request, where preprocessing, which both paths share, dominates. PIL's
+pixel buffers are not traced. Images go to the local blob store in a temporary
+directory so mongomock's GridFS copies do not swamp the numbers.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ["BLOB_STORE_BACKEND"] = "local"
+os.environ["BLOB_STORE_PATH"] = tempfile.mkdtemp(prefix="intuitiq-bench-upload-")
+
+import mongomock
+import mongomock.gridfs
+from PIL import Image, ImageDraw
+import database
+import main
+from apps.calculator import imageRoute, imageUtils
+from benchmarks.canvases import sample_canvases
+from benchmarks.stubs import CANNED_IMAGE, StubGemini, StubProvider, asgi_request, json_body
+from history_writer import history_writer
+from providers import backends
+
+CHUNK = 64 * 1024
+ingested = []
+
+
+def observe_ingest():
+    # Records when and at what memory peak the route hands the PNG to preprocessing
+    preprocess_canvas = imageRoute.preprocess_canvas
+
+    def observed(raw):
+        ingested.append((time.perf_counter(), tracemalloc.get_traced_memory()[1]))
+        return preprocess_canvas(raw)
+
+    imageRoute.preprocess_canvas = observed
+
+
+def dense_canvas(width, height, strokes=1500):
+    # Many thin coloured strokes compress badly, which makes for a multi-megabyte PNG
+    rng = random.Random(0)
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(strokes):
+        points = [(rng.randrange(width), rng.randrange(height)) for _ in range(4)]
+        draw.line(points, fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256), 255), width=rng.randint(1, 4))
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def canvases():
+    hd, uhd = sample_canvases(), sample_canvases(3840, 2160)
+    return {
+        "1080p scribble": hd["scribble"],
+        "4K wagon wheel": uhd["wagon_wheel"],
+        "4K scribble": uhd["scribble"],
+        "4K dense": dense_canvas(3840, 2160),
+    }
+
+
+def json_request(png, tag):
+    url = "data:image/png;base64," + base64.b64encode(png).decode()
+    return ("/image_calculate", json_body({"user_id": "bench", "image": url, "dict_of_vars": {"tag": tag}}), "application/json", b"")
+
+
+def raw_request(png, tag):
+    query = urlencode({"user_id": "bench", "dict_of_vars": json.dumps({"tag": tag})}).encode()
+    return ("/image_calculate/upload", png, "image/png", query)
+
+
+async def measure(make_request, png, repeat):
+    rows = []
+    for i in range(repeat):
+        # A fresh dict_of_vars per request keeps the solution cache cold
+        path, body, content_type, query = make_request(png, f"{make_request.__name__}-{i}")
+        ingested.clear()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = await asgi_request(main.app, "POST", path, body, content_type, query, chunk_size=CHUNK)
+        total, peak = time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert result["status"] == 200, result["body"][:200]
+        ingest_at, ingest_peak = ingested[0]
+        rows.append((ingest_at - start, ingest_peak, total, peak))
+        # The request body is built outside the measurement; drop it before the next one
+        del body
+    return [statistics.median(column) for column in zip(*rows)], len(make_request(png, "size")[1])
+
+
+async def run(args):
+    mongomock.gridfs.enable_gridfs_integration()
+    database.connect(mongomock.MongoClient())
+    backends.clients["gemini"] = StubGemini(StubProvider(CANNED_IMAGE, 0.0, 0.0, 1))
+    # Keep failover away from the real Mistral client
+    backends.clients["mistral"] = None
+    imageUtils.router.hedging = False
+    observe_ingest()
+
+    print(f"medians of {args.repeat} requests")
+    print(f"{'canvas':<16} {'png KB':>7} {'path':<5} {'body KB':>8} {'ingest ms':>10} {'ingest MB':>10} {'total ms':>9} {'total MB':>9}")
+    for name, png in canvases().items():
+        for label, make_request in (("json", json_request), ("raw", raw_request)):
+            (ingest, ingest_peak, total, peak), body_size = await measure(make_request, png, args.repeat)
+            print(
+                f"{name:<16} {len(png) / 1024:>7.0f} {label:<5} {body_size / 1024:>8.0f} {ingest * 1000:>10.1f} "
+                f"{ingest_peak / 2 ** 20:>10.2f} {total * 1000:>9.1f} {peak / 2 ** 20:>9.2f}"
+            )
+    await history_writer.stop()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
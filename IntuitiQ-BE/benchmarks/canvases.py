@@ -0,0 +1,59 @@
+import math
+import random
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+
+WHITE = (255, 255, 255, 255)
+RED = (0xee, 0x33, 0x33, 255)
+BLUE = (0x22, 0x8b, 0xe6, 255)
+GREEN = (0x40, 0xc0, 0x57, 255)
+
+
+def _canvas(width, height, draw_fn, seed):
+    # Draw at 2x and scale down so strokes get anti-aliased edges like a browser canvas
+    big = Image.new("RGBA", (width * 2, height * 2), (0, 0, 0, 0))
+    draw_fn(ImageDraw.Draw(big), width * 2, height * 2, random.Random(seed))
+    img = big.resize((width, height), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _expression(draw, width, height, rng):
+    font = ImageFont.load_default(size=120)
+    x, y = width // 3 + rng.randint(-50, 50), height // 3 + rng.randint(-50, 50)
+    draw.text((x, y), "2 + 3 * 4", fill=WHITE, font=font)
+
+
+def _equations(draw, width, height, rng):
+    font = ImageFont.load_default(size=100)
+    draw.text((width // 4, height // 4), "x + y = 5", fill=WHITE, font=font)
+    draw.text((width // 4, height // 4 + 160), "x - y = 1", fill=WHITE, font=font)
+
+
+def _wagon_wheel(draw, width, height, rng):
+    cx, cy, radius = width // 2, height // 2, min(width, height) // 3
+    draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius), outline=GREEN, width=8)
+    for i, color in enumerate([RED] * 3 + [BLUE] * 5):
+        angle = i * 2 * math.pi / 8 + rng.random() * 0.2
+        end = (cx + radius * math.cos(angle), cy + radius * math.sin(angle))
+        draw.line((cx, cy, *end), fill=color, width=10)
+    font = ImageFont.load_default(size=60)
+    draw.text((40, 40), "red = 6 runs, blue = 4 runs", fill=WHITE, font=font)
+
+
+def _scribble(draw, width, height, rng):
+    points = [(rng.randint(0, width), rng.randint(0, height)) for _ in range(40)]
+    draw.line(points, fill=WHITE, width=6, joint="curve")
+
+
+SAMPLES = {
+    "expression": _expression,
+    "equations": _equations,
+    "wagon_wheel": _wagon_wheel,
+    "scribble": _scribble,
+}
+
+
+def sample_canvases(width=1920, height=1080):
+    return {name: _canvas(width, height, fn, seed) for seed, (name, fn) in enumerate(SAMPLES.items())}
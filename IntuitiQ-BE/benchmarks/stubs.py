@@ -0,0 +1,187 @@
+"""Stand-ins for the Mistral and Gemini clients and an in-process ASGI driver.
+
+The stub clients mimic only the SDK surface the app uses. Each call waits
+``first_token_latency`` seconds and then emits the canned answer in chunks,
+``token_interval`` seconds apart. ``jitter`` spreads the first-token latency
+log-normally so percentiles under load look like a real provider's.
+"""
+import ast
+import asyncio
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+
+CANNED_TEXT = (
+    "[{'expr': 'P(two heads)', 'steps': 'Step 1: The sample space is {HH, HT, TH, TT}, so there are 4 outcomes.\\n"
+    "Step 2: Only HH is favourable, so there is 1 favourable outcome.\\nStep 3: P = 1 / 4 = 0.25', 'result': '0.2500'}]"
+)
+CANNED_IMAGE = "[{'expr': '2 + 3 * 4', 'steps': 'Step 1: 3 * 4 = 12\\nStep 2: 2 + 12 = 14', 'result': '14'}]"
+
+
+def estimate_tokens(*parts):
+    return sum(len(str(part)) for part in parts) // 4
+
+
+def split_chunks(text: str, count: int):
+    size = max(1, len(text) // count)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StubProvider:
+    def __init__(self, canned: str, first_token_latency=0.8, token_interval=0.02, chunks=30, jitter=0.0, seed=None):
+        self.canned = canned
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.chunks = chunks
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def first_token_delay(self):
+        if not self.jitter:
+            return self.first_token_latency
+        return self.first_token_latency * self.rng.lognormvariate(0, self.jitter)
+
+    async def full(self, answers=1):
+        self.calls += 1
+        await asyncio.sleep(self.first_token_delay() + self.token_interval * self.chunks * answers)
+        if answers == 1:
+            return self.canned
+        item = self.canned.strip()[1:-1]
+        return "[" + ", ".join(f"{{'problem': {i}, {item[1:]}" for i in range(1, answers + 1)) + "]"
+
+    async def stream(self):
+        self.calls += 1
+        await asyncio.sleep(self.first_token_delay())
+        for i, chunk in enumerate(split_chunks(self.canned, self.chunks)):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            yield chunk
+
+
+class StubMistral:
+    def __init__(self, provider: StubProvider):
+        self.provider = provider
+        self.chat = self
+
+    async def complete_async(self, **kwargs):
+        # Packed batch prompts list one numbered problem per line; answer each of them
+        user_message = kwargs["messages"][-1]["content"]
+        packed = len(re.findall(r"^\d+\. ", user_message, flags=re.M)) if user_message.startswith("Problems:") else 1
+        content = await self.provider.full(answers=packed)
+        usage = SimpleNamespace(prompt_tokens=estimate_tokens(kwargs["messages"]), completion_tokens=estimate_tokens(content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    async def stream_async(self, **kwargs):
+        async def events():
+            async for chunk in self.provider.stream():
+                delta = SimpleNamespace(content=chunk)
+                yield SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+        return events()
+
+
+class StubGemini:
+    """With ``structured`` it answers like Gemini under a response schema: a JSON
+    array whose items hold only the properties the schema defines."""
+
+    def __init__(self, provider: StubProvider, structured=False):
+        self.provider = provider
+        self.structured = structured
+        self.aio = SimpleNamespace(models=self, caches=self)
+        self.cached = {}
+
+    def structured_answers(self, schema, packed: int):
+        answer = ast.literal_eval(self.provider.canned)[0]
+        properties = schema.items.properties
+        items = [{**{k: v for k, v in answer.items() if k in properties}, "problem": i} for i in range(1, packed + 1)]
+        if "problem" not in properties:
+            items = [{k: v for k, v in item.items() if k != "problem"} for item in items]
+        return json.dumps(items)
+
+    async def create(self, model, config):
+        name = f"cachedContents/stub-{len(self.cached)}"
+        self.cached[name] = estimate_tokens(config.system_instruction)
+        return SimpleNamespace(name=name)
+
+    async def delete(self, name):
+        self.cached.pop(name, None)
+
+    async def generate_content(self, **kwargs):
+        config = kwargs["config"]
+        user_message = kwargs["contents"][0]
+        packed = len(re.findall(r"^\d+\. ", user_message, flags=re.M)) if user_message.startswith("Problems:") else 1
+        text = await self.provider.full(answers=packed)
+        if self.structured and config.response_schema is not None:
+            text = self.structured_answers(config.response_schema, packed)
+        # Images cost a flat 258 tokens on Gemini; the prompt is either inline or in cached content
+        cached = self.cached.get(config.cached_content, 0)
+        prompt = cached + estimate_tokens(config.system_instruction or "", *kwargs["contents"][:-1]) + 258
+        usage = SimpleNamespace(
+            prompt_token_count=prompt,
+            cached_content_token_count=cached,
+            candidates_token_count=estimate_tokens(text)
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    async def generate_content_stream(self, **kwargs):
+        async def chunks():
+            async for chunk in self.provider.stream():
+                yield SimpleNamespace(text=chunk)
+        return chunks()
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"", content_type="application/json", query=b"", chunk_size=None):
+    """Drive one request through the ASGI app and time the first body byte.
+
+    With ``chunk_size`` the body arrives in pieces of that size, as it would off a socket.
+    """
+    start = time.perf_counter()
+    state = {"status": None, "first_byte": None, "body": bytearray()}
+    size = chunk_size or max(1, len(body))
+    pieces = [body[i:i + size] for i in range(0, len(body), size)] or [b""]
+    pending = [
+        {"type": "http.request", "body": piece, "more_body": i < len(pieces) - 1}
+        for i, piece in enumerate(pieces)
+    ]
+    never = asyncio.Event()
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        await never.wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if state["first_byte"] is None:
+                state["first_byte"] = time.perf_counter() - start
+            state["body"].extend(message["body"])
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query,
+        "root_path": "",
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    await app(scope, receive, send)
+    return {
+        "status": state["status"],
+        "ttfb": state["first_byte"],
+        "total": time.perf_counter() - start,
+        "body": bytes(state["body"]),
+    }
+
+
+def json_body(payload: dict):
+    return json.dumps(payload).encode()
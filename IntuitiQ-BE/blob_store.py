@@ -0,0 +1,87 @@
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+from PIL import Image
+from constants import BLOB_STORE_BACKEND, BLOB_STORE_PATH, THUMBNAIL_SIZE
+
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+CHUNK_SIZE = 64 * 1024
+
+
+def digest_of(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_digest(value: str):
+    return bool(DIGEST_PATTERN.fullmatch(value))
+
+
+def make_thumbnail(img: Image.Image, size=THUMBNAIL_SIZE):
+    thumb = img.convert("RGB")
+    thumb.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    thumb.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+class GridFSBlobStore:
+    def __init__(self, db, collection="image_blobs"):
+        import gridfs
+        self.fs = gridfs.GridFS(db, collection=collection)
+
+    def put(self, data: bytes, content_type="image/png"):
+        from gridfs.errors import FileExists
+        digest = digest_of(data)
+        if not self.fs.exists(digest):
+            try:
+                self.fs.put(data, _id=digest, content_type=content_type)
+            except FileExists:
+                pass
+        return digest
+
+    def open(self, digest: str):
+        from gridfs.errors import NoFile
+        try:
+            out = self.fs.get(digest)
+        except NoFile:
+            return None
+        return iter(lambda: out.read(CHUNK_SIZE), b""), out.content_type or "image/png"
+
+
+class LocalBlobStore:
+    def __init__(self, root=BLOB_STORE_PATH):
+        self.root = root
+
+    def path_for(self, digest: str):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data: bytes, content_type="image/png"):
+        digest = digest_of(data)
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def open(self, digest: str):
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            return None
+
+        def chunks():
+            with open(path, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    yield chunk
+
+        return chunks(), "image/png"
+
+
+def create_blob_store(db):
+    if BLOB_STORE_BACKEND == "local":
+        return LocalBlobStore()
+    return GridFSBlobStore(db)
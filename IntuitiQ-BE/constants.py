@@ -7,4 +7,70 @@ PORT = '8900'
 ENV = 'dev'
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
\ No newline at end of file
+MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+
+MISTRAL_MAX_CONCURRENCY = int(os.getenv("MISTRAL_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "60"))
+
+SOLUTION_CACHE_SIZE = int(os.getenv("SOLUTION_CACHE_SIZE", "2048"))
+SOLUTION_CACHE_TTL = float(os.getenv("SOLUTION_CACHE_TTL", str(7 * 24 * 3600)))
+SOLUTION_CACHE_PATH = os.getenv("SOLUTION_CACHE_PATH")
+
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_CROP_PADDING = int(os.getenv("IMAGE_CROP_PADDING", "16"))
+IMAGE_QUANTIZE = os.getenv("IMAGE_QUANTIZE", "true").lower() == "true"
+IMAGE_PALETTE_SIZE = int(os.getenv("IMAGE_PALETTE_SIZE", "32"))
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Mirrors SWATCHES in IntuitiQ-FE/src/constants.ts
+CANVAS_SWATCHES = [
+    "#000000", "#ffffff", "#ee3333", "#e64980", "#be4bdb", "#893200",
+    "#228be6", "#3333ee", "#40c057", "#00aa00", "#fab005", "#fd7e14",
+]
+
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "gridfs")
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "blobs")
+THUMBNAIL_SIZE = (int(os.getenv("THUMBNAIL_WIDTH", "320")), int(os.getenv("THUMBNAIL_HEIGHT", "160")))
+
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "intuitiq")
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "1000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+HISTORY_ENQUEUE_TIMEOUT = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT", "1.0"))
+
+
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+BATCH_PACK_SIZE = int(os.getenv("BATCH_PACK_SIZE", "5"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
+PARSE_RETRIES = int(os.getenv("PARSE_RETRIES", "1"))
+
+
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "true").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", str(60 * 60)))
+
+
+# Comma-separated "provider:model" backends, tried in order; "fake:<name>" runs a local fake provider
+TEXT_BACKENDS = os.getenv("TEXT_BACKENDS", "mistral:mistral-large-latest,gemini:gemini-2.0-flash")
+TEXT_CHEAP_BACKENDS = os.getenv("TEXT_CHEAP_BACKENDS", "mistral:mistral-small-latest")
+IMAGE_BACKENDS = os.getenv("IMAGE_BACKENDS", "gemini:gemini-2.0-flash,mistral:pixtral-large-latest")
+IMAGE_CHEAP_BACKENDS = os.getenv("IMAGE_CHEAP_BACKENDS", "gemini:gemini-2.0-flash-lite")
+CHEAP_TIER = os.getenv("CHEAP_TIER", "true").lower() == "true"
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "3.0"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.25"))
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "2"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Share of raw provider responses logged at DEBUG; unparseable ones are always logged as warnings
+RAW_RESPONSE_SAMPLE_RATE = float(os.getenv("RAW_RESPONSE_SAMPLE_RATE", "0.01"))
@@ -0,0 +1,45 @@
+import threading
+from blob_store import create_blob_store
+from constants import MONGO_URI, MONGO_DB
+
+client = None
+_blob_store = None
+# The lifespan warm-up connects from a worker thread while requests may already be connecting
+_lock = threading.Lock()
+
+
+def connect(mongo_client=None):
+    global client, _blob_store
+    if client is not None and mongo_client is None:
+        return client
+    with _lock:
+        if client is None or mongo_client is not None:
+            if mongo_client is None:
+                from pymongo import MongoClient
+                mongo_client = MongoClient(MONGO_URI)
+            client = mongo_client
+            _blob_store = None
+    return client
+
+
+def close():
+    global client, _blob_store
+    if client is not None:
+        client.close()
+    client = None
+    _blob_store = None
+
+
+def get_db():
+    return connect()[MONGO_DB]
+
+
+def get_collection(name: str):
+    return get_db()[name]
+
+
+def get_blob_store():
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = create_blob_store(get_db())
+    return _blob_store
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+import database
+from constants import HISTORY_QUEUE_SIZE, HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL, HISTORY_ENQUEUE_TIMEOUT
+from metrics import Collected, Histogram, history_insert_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    def __init__(self, maxsize=HISTORY_QUEUE_SIZE, batch_size=HISTORY_BATCH_SIZE,
+                 flush_interval=HISTORY_FLUSH_INTERVAL, enqueue_timeout=HISTORY_ENQUEUE_TIMEOUT):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.queue = None
+        self.task = None
+        self.pending = set()
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "direct_writes": 0,
+        }
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.task = asyncio.create_task(self.run())
+
+    async def wait_pending(self):
+        """Waits for records handed to write_later to be built and queued."""
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+
+    async def stop(self):
+        await self.wait_pending()
+        if self.task is None:
+            return
+        if not self.task.done():
+            await self.queue.put(None)
+        try:
+            await self.task
+        except Exception:
+            logger.exception("History writer task failed")
+        self.task = None
+        leftovers = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                leftovers.append(item)
+        if leftovers:
+            await self.flush(leftovers)
+
+    async def write(self, collection_name: str, record: dict):
+        await self.write_many(collection_name, [record])
+
+    async def write_many(self, collection_name: str, records: list):
+        if not records:
+            return
+        item = (collection_name, records)
+        if self.running:
+            try:
+                self.queue.put_nowait(item)
+                self.stats["enqueued"] += len(records)
+                return
+            except asyncio.QueueFull:
+                pass
+            try:
+                await asyncio.wait_for(self.queue.put(item), timeout=self.enqueue_timeout)
+                self.stats["enqueued"] += len(records)
+                return
+            except asyncio.TimeoutError:
+                logger.warning("History queue full, writing %d records to %s directly", len(records), collection_name)
+        self.stats["direct_writes"] += len(records)
+        await self.flush([item])
+
+    def write_later(self, collection_name: str, build_record):
+        """Builds the record in a worker thread off the request path, then queues it.
+
+        For records that need slow blocking work first, such as blob uploads.
+        """
+        task = asyncio.create_task(self.build_and_write(collection_name, build_record))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def build_and_write(self, collection_name: str, build_record):
+        try:
+            record = await asyncio.to_thread(build_record)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error("Failed to build a history record for %s: %s", collection_name, e)
+            return
+        await self.write(collection_name, record)
+
+    async def run(self):
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            count = len(item[1])
+            deadline = time.monotonic() + self.flush_interval
+            while count < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                count += len(item[1])
+            try:
+                await self.flush(batch)
+            except Exception:
+                # flush handles its own failures; this only keeps batching alive if that ever breaks
+                logger.exception("Failed to flush %d history records", count)
+
+    async def flush(self, batch: list):
+        # Imported here so the app does not load the whole driver at import; it is loaded by now
+        from pymongo.errors import PyMongoError
+        grouped = {}
+        for collection_name, records in batch:
+            grouped.setdefault(collection_name, []).extend(records)
+        with history_flush_seconds.time():
+            for collection_name, records in grouped.items():
+                try:
+                    collection = database.get_collection(collection_name)
+                    with history_insert_seconds.time(collection=collection_name):
+                        await asyncio.to_thread(collection.insert_many, records, ordered=False)
+                    self.stats["written"] += len(records)
+                except PyMongoError as e:
+                    self.stats["failed"] += len(records)
+                    logger.error("Failed to write %d history records to %s: %s", len(records), collection_name, e)
+                except Exception as e:
+                    # A client-side failure such as a BSON encoding error aborts the whole
+                    # insert_many, so retry one by one to drop only the offending records
+                    logger.warning("Batch write to %s failed (%s), retrying %d records one by one",
+                                   collection_name, e, len(records))
+                    await self.insert_each(collection_name, records)
+
+    async def insert_each(self, collection_name: str, records: list):
+        from pymongo.errors import DuplicateKeyError
+        for record in records:
+            try:
+                collection = database.get_collection(collection_name)
+                await asyncio.to_thread(collection.insert_one, record)
+                self.stats["written"] += 1
+            except DuplicateKeyError:
+                # Already inserted by the insert_many that failed part-way through
+                self.stats["written"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error("Failed to write a history record to %s: %s", collection_name, e)
+
+    def queue_depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+
+history_writer = HistoryWriter()
+
+history_flush_seconds = Histogram("intuitiq_history_flush_seconds", "Time to write one batch of queued history records.")
+Collected("intuitiq_history_records_total", "History records by how they were written.", "counter", ("result",), lambda: [
+    ({"result": result}, count) for result, count in history_writer.stats.items()
+])
+Collected("intuitiq_history_queue_depth", "History records waiting to be written.", "gauge", (), lambda: [
+    ({}, history_writer.queue_depth())
+])
@@ -1,18 +1,64 @@
+import asyncio
+import logging
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from fastapi.responses import JSONResponse, PlainTextResponse
 import os
 from apps.calculator.imageRoute import image_router, image_history_router
 from apps.calculator.textRoute import text_router, text_history_router
-from constants import SERVER_URL, PORT, ENV
+from apps.calculator import imageRoute, textRoute
+from constants import SERVER_URL, PORT, ENV, LOG_LEVEL
+from pagination import ensure_history_index
+from history_writer import history_writer
+import database
+import metrics
+from metrics import MetricsMiddleware
+from providers import backends
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+def create_indexes():
+    for name in (textRoute.COLLECTION, imageRoute.COLLECTION):
+        try:
+            ensure_history_index(database.get_collection(name))
+        except Exception as e:
+            logger.warning("Could not create index on %s: %s", name, e)
+
+readiness = {"ready": False, "warm_up_seconds": None, "error": None}
+
+def warm_up():
+    start = time.perf_counter()
+    database.connect()
+    create_indexes()
+    backends.warm_up()
+    return time.perf_counter() - start
+
+async def warm_up_in_background():
+    # Serving starts right away; requests that arrive first create what they need on demand
+    try:
+        readiness["warm_up_seconds"] = round(await asyncio.to_thread(warm_up), 3)
+        readiness["ready"] = True
+        logger.info("Warm-up finished in %.2f s", readiness["warm_up_seconds"])
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.exception("Warm-up failed")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    history_writer.start()
+    warm_up_task = asyncio.create_task(warm_up_in_background())
     yield
+    await warm_up_task
+    await history_writer.stop()
+    database.close()
 
 app = FastAPI(lifespan=lifespan)
 
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -28,6 +74,14 @@ app.add_middleware(
 async def root():
     return {"message": "Server is running"}
 
+@app.get('/ready')
+async def ready():
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(image_router, prefix="/image_calculate", tags=["image"])
 app.include_router(image_history_router, prefix="/image_history", tags=["image_history"])
 app.include_router(text_router, prefix="/text_calculate", tags=["text"])
@@ -37,4 +91,5 @@ app.include_router(text_history_router, prefix="/text_history", tags=["text_hist
 #     uvicorn.run("main:app", host=SERVER_URL, port=int(PORT), reload=(ENV == "dev"))
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=False)
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""One-off migrations for the history collections.
+
+Run from IntuitiQ-BE/:
+
+    python migrate_history.py images dates
+"""
+import argparse
+import base64
+from datetime import datetime
+from io import BytesIO
+from PIL import Image
+from pytz import timezone, utc
+from pymongo import UpdateOne
+from apps.calculator.preprocessUtils import crop_to_strokes, flatten
+from blob_store import make_thumbnail
+import database
+
+BATCH_SIZE = 500
+
+
+def migrate_images(db):
+    collection = db["image_io_history"]
+    blob_store = database.get_blob_store()
+    updates = []
+    migrated = 0
+    for entry in collection.find({"image": {"$exists": True}}, {"_id": 1, "image": 1}):
+        try:
+            image_data = base64.b64decode(entry["image"].split(",")[1])
+            thumbnail = make_thumbnail(crop_to_strokes(flatten(Image.open(BytesIO(image_data)))))
+        except Exception as e:
+            print(f"Skipping {entry['_id']}: {e}")
+            continue
+        refs = {"image_ref": blob_store.put(image_data), "thumbnail_ref": blob_store.put(thumbnail)}
+        updates.append(UpdateOne({"_id": entry["_id"]}, {"$set": refs, "$unset": {"image": ""}}))
+        if len(updates) >= BATCH_SIZE:
+            migrated += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        migrated += collection.bulk_write(updates, ordered=False).modified_count
+    print(f"Moved {migrated} inline images to the blob store")
+
+
+def parse_legacy_date(entry: dict):
+    try:
+        local = timezone("Asia/Kolkata").localize(datetime.strptime(entry["date"], "%d/%m/%Y %H:%M:%S"))
+        return local.astimezone(utc).replace(tzinfo=None)
+    except (KeyError, TypeError, ValueError):
+        return entry["_id"].generation_time.replace(tzinfo=None)
+
+
+def migrate_dates(db):
+    for name in ("text_io_history", "image_io_history"):
+        collection = db[name]
+        updates = []
+        migrated = 0
+        for entry in collection.find({"created_at": {"$exists": False}}, {"_id": 1, "date": 1}):
+            updates.append(UpdateOne({"_id": entry["_id"]}, {"$set": {"created_at": parse_legacy_date(entry)}}))
+            if len(updates) >= BATCH_SIZE:
+                migrated += collection.bulk_write(updates, ordered=False).modified_count
+                updates = []
+        if updates:
+            migrated += collection.bulk_write(updates, ordered=False).modified_count
+        print(f"Added created_at to {migrated} documents in {name}")
+
+
+MIGRATIONS = {"images": migrate_images, "dates": migrate_dates}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("migrations", nargs="+", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+    db = database.get_db()
+    for name in args.migrations:
+        MIGRATIONS[name](db)
@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime, timezone
+from bson import ObjectId
+
+# pymongo's sort directions, spelled out so importing this module does not load the driver
+ASCENDING, DESCENDING = 1, -1
+
+HISTORY_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+HISTORY_INDEX = [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(entry: dict):
+    payload = {"t": entry["created_at"].isoformat(), "id": str(entry["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = datetime.fromisoformat(payload["t"])
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return created_at, ObjectId(payload["id"])
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def ensure_history_index(collection):
+    collection.create_index(HISTORY_INDEX, name="user_created_at")
+
+
+def paginate_history(collection, user_id: str, projection: dict, limit: int, cursor: str = None):
+    query = {"user_id": user_id}
+    if cursor:
+        created_at, entry_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": entry_id}},
+        ]
+    projection = {**projection, "created_at": 1}
+    entries = list(collection.find(query, projection).sort(HISTORY_SORT).limit(limit + 1))
+    next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return entries[:limit], next_cursor
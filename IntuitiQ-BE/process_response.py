@@ -1,7 +1,466 @@
+import ast
+import json
+import logging
+import random
 import re
-def process_response_from_json(response):
+from constants import RAW_RESPONSE_SAMPLE_RATE
+from metrics import Collected
+
+logger = logging.getLogger(__name__)
+
+ANSWER_FIELDS = ("expr", "steps", "result")
+parse_stats = {"json": 0, "literal": 0, "repaired": 0, "failed": 0, "retried": 0}
+Collected("intuitiq_parse_outcomes_total", "Provider responses by how they were parsed.", "counter", ("outcome",), lambda: [
+    ({"outcome": outcome}, count) for outcome, count in parse_stats.items()
+])
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def strip_fences(response: str):
     text = response.strip()
-    text = re.sub(r'^```json\s*', '', text)
-    text = re.sub(r'^```', '', text)
-    text = re.sub(r'```$', '', text)
-    return text
\ No newline at end of file
+    text = re.sub(r'^```[a-zA-Z]*\s*', '', text)
+    text = re.sub(r'\s*```$', '', text)
+    return text
+
+
+def extract_payload(text: str):
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if not starts:
+        return text
+    start = min(starts)
+    end = max(text.rfind("]"), text.rfind("}"))
+    return text[start:end + 1] if end > start else text[start:]
+
+
+class TolerantParser:
+    """Best-effort reader for the Python/JSON-ish literals LLMs produce.
+
+    It accepts either quote style, Python and JSON keywords, raw newlines in
+    strings, missing or trailing commas, unescaped quotes inside strings and
+    output truncated mid-way. Anything it had to guess at sets ``repaired``.
+    """
+
+    KEYWORDS = {"true": True, "True": True, "false": False, "False": False, "null": None, "None": None}
+    ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/"}
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.repaired = False
+
+    def parse(self):
+        start = min((i for i in (self.text.find("["), self.text.find("{")) if i != -1), default=-1)
+        if start == -1:
+            raise SchemaError("No list or dict found")
+        self.pos = start
+        return self.value("")
+
+    def skip_ws(self, pos=None):
+        pos = self.pos if pos is None else pos
+        while pos < len(self.text) and self.text[pos].isspace():
+            pos += 1
+        return pos
+
+    def value(self, closers: str):
+        self.pos = self.skip_ws()
+        if self.pos >= len(self.text):
+            self.repaired = True
+            return None
+        char = self.text[self.pos]
+        if char == "[":
+            return self.container("]")
+        if char == "{":
+            return self.container("}")
+        if char in "'\"":
+            return self.string(closers)
+        return self.scalar()
+
+    def container(self, closer: str):
+        self.pos += 1
+        is_dict = closer == "}"
+        out = {} if is_dict else []
+        while True:
+            self.pos = self.skip_ws()
+            if self.pos >= len(self.text):
+                self.repaired = True
+                return out
+            char = self.text[self.pos]
+            if char == closer:
+                self.pos += 1
+                return out
+            if char == ",":
+                self.pos += 1
+                continue
+            if char in "]}":
+                # Mismatched bracket: close this container and let the parent continue
+                self.repaired = True
+                return out
+            if not is_dict:
+                out.append(self.value(",]"))
+                continue
+            key = self.string(":") if char in "'\"" else self.bare_key()
+            self.pos = self.skip_ws()
+            if self.pos < len(self.text) and self.text[self.pos] == ":":
+                self.pos += 1
+            else:
+                self.repaired = True
+            out[key] = self.value(",}")
+
+    def string(self, closers: str):
+        quote = self.text[self.pos]
+        self.pos += 1
+        chars = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == "\\" and self.pos + 1 < len(self.text):
+                escaped = self.text[self.pos + 1]
+                if escaped == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", self.text[self.pos + 2:self.pos + 6]):
+                    chars.append(chr(int(self.text[self.pos + 2:self.pos + 6], 16)))
+                    self.pos += 6
+                    continue
+                chars.append(self.ESCAPES.get(escaped, escaped))
+                self.pos += 2
+                continue
+            if char == quote:
+                if self.terminates(self.pos + 1, closers):
+                    self.pos += 1
+                    return "".join(chars)
+                self.repaired = True
+            chars.append(char)
+            self.pos += 1
+        self.repaired = True
+        return "".join(chars)
+
+    def terminates(self, pos: int, closers: str):
+        pos = self.skip_ws(pos)
+        if pos >= len(self.text) or not closers:
+            return True
+        char = self.text[pos]
+        if char == "," and "," in closers:
+            nxt = self.skip_ws(pos + 1)
+            if nxt >= len(self.text):
+                return True
+            allowed = "'\"}" if "}" in closers else "'\"{[]-0123456789tfnTFN"
+            return self.text[nxt] in allowed
+        if char in closers:
+            return True
+        if char in "'\"" and "}" in closers:
+            # Adjacent strings inside a dict usually mean a missing comma before the next key
+            end = self.text.find(char, pos + 1)
+            return end != -1 and self.text[self.skip_ws(end + 1):self.skip_ws(end + 1) + 1] == ":"
+        return False
+
+    def bare_key(self):
+        match = re.compile(r"[^:,}\s]+").match(self.text, self.pos)
+        self.repaired = True
+        if not match:
+            self.pos += 1
+            return ""
+        self.pos = match.end()
+        return match.group(0)
+
+    def scalar(self):
+        match = re.compile(r"[^,\]}\n]*").match(self.text, self.pos)
+        self.pos = match.end()
+        token = match.group(0).strip()
+        if token in self.KEYWORDS:
+            return self.KEYWORDS[token]
+        try:
+            return int(token)
+        except ValueError:
+            pass
+        try:
+            return float(token)
+        except ValueError:
+            self.repaired = True
+            return token
+
+
+def to_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "\n".join(to_text(item) for item in value)
+    if isinstance(value, dict):
+        return ", ".join(f"{k} = {to_text(v)}" for k, v in value.items())
+    return str(value)
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() == "true"
+    return bool(value)
+
+
+def to_index(value):
+    try:
+        return int(str(value).strip().rstrip("."))
+    except ValueError:
+        return None
+
+
+def normalize_answers(data, with_assign: bool = False, with_problem: bool = False):
+    if isinstance(data, dict) and isinstance(data.get("answers"), list):
+        data = data["answers"]
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not data:
+        raise SchemaError("Expected a non-empty list of answers")
+    answers = []
+    for item in data:
+        if not isinstance(item, dict) or not any(field in item for field in ANSWER_FIELDS):
+            raise SchemaError(f"Unexpected answer item: {item!r}")
+        answer = {field: to_text(item.get(field)) for field in ANSWER_FIELDS}
+        if with_assign:
+            answer["assign"] = to_bool(item.get("assign", False))
+        if with_problem:
+            answer["problem"] = to_index(item.get("problem"))
+        answers.append(answer)
+    return answers
+
+
+def parse_response(response: str, with_assign: bool = False, with_problem: bool = False):
+    """Return ``(answers, outcome)``; answers is None when nothing usable was found."""
+    payload = extract_payload(strip_fences(response or ""))
+    attempts = (
+        ("json", json.loads),
+        ("literal", ast.literal_eval),
+    )
+    for outcome, loader in attempts:
+        try:
+            answers = normalize_answers(loader(payload), with_assign, with_problem)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+        parse_stats[outcome] += 1
+        return answers, outcome
+    try:
+        answers = normalize_answers(TolerantParser(payload).parse(), with_assign, with_problem)
+        # A reply cut off before its result would otherwise pass as a repaired answer with nothing in it
+        if not all(answer["result"].strip() for answer in answers):
+            raise SchemaError("Repaired answer has no result")
+    except (SchemaError, RecursionError):
+        parse_stats["failed"] += 1
+        return None, "failed"
+    parse_stats["repaired"] += 1
+    return answers, "repaired"
+
+
+def log_response(kind: str, response: str, answers, outcome: str):
+    if outcome == "failed":
+        logger.warning("Could not parse %s response: %.500r", kind, response)
+    elif logger.isEnabledFor(logging.DEBUG) and random.random() < RAW_RESPONSE_SAMPLE_RATE:
+        logger.debug("Sampled %s response (%s): %.2000r -> %r", kind, outcome, response, answers)
+
+
+def unparsed_answer(response: str, with_assign: bool = False):
+    answer = {"expr": "", "steps": "", "result": strip_fences(response or "")}
+    if with_assign:
+        answer["assign"] = False
+    return [answer]
+
+
+class IncrementalParser:
+    """Scans a streamed response once and reports new 'steps' text as it appears.
+
+    It reads by TolerantParser's rules but keeps its place between chunks, so
+    each character is looked at about once. It stops in front of anything the
+    next chunk could still change (a trailing backslash or unfinished escape, a
+    quote that may or may not close its string, a scalar or bare key cut off at
+    the end) and picks up from there on the next feed.
+    """
+
+    PLAIN = re.compile(r"[^\\'\"]+")
+    SCALAR = re.compile(r"[^,\]}\n]*")
+    BARE_KEY = re.compile(r"[^:,}\s]+")
+    HEX = re.compile(r"[0-9a-fA-F]{0,4}")
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.stack = []
+        self.string = None
+        self.started = False
+        self.updates = []
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        self.updates = []
+        while self.advance():
+            pass
+        if self.string is not None:
+            self.emit(self.string)
+        return self.updates
+
+    def emit(self, string: dict):
+        if string["steps_index"] is None or string["sent"] == len(string["chars"]):
+            return
+        text = "".join(string["chars"][string["sent"]:])
+        string["sent"] = len(string["chars"])
+        if self.updates and self.updates[-1]["index"] == string["steps_index"]:
+            self.updates[-1]["steps"] += text
+        else:
+            self.updates.append({"index": string["steps_index"], "steps": text})
+
+    def skip_ws(self, pos: int):
+        while pos < len(self.text) and self.text[pos].isspace():
+            pos += 1
+        return pos
+
+    def advance(self):
+        """Consume one token; False once the rest of the buffer cannot be decided yet."""
+        if self.string is not None:
+            return self.read_string()
+        if not self.stack:
+            if self.started:
+                return False
+            starts = [i for i in (self.text.find("[", self.pos), self.text.find("{", self.pos)) if i != -1]
+            if not starts:
+                self.pos = len(self.text)
+                return False
+            self.pos = min(starts)
+            self.started = True
+            is_list = self.text[self.pos] == "["
+            self.push(self.text[self.pos], answers=is_list, answer=None if is_list else 0)
+            return True
+        self.pos = self.skip_ws(self.pos)
+        if self.pos >= len(self.text):
+            return False
+        frame = self.stack[-1]
+        char = self.text[self.pos]
+        phase = frame["phase"]
+        if phase == "colon":
+            if char == ":":
+                self.pos += 1
+            frame["phase"] = "value"
+            return True
+        if phase == "value":
+            if not self.start_value(frame, ",}"):
+                return False
+            frame["phase"] = "key"
+            return True
+        if char == frame["closer"]:
+            self.pos += 1
+            self.stack.pop()
+            return True
+        if char == ",":
+            self.pos += 1
+            return True
+        if char in "]}":
+            # Mismatched bracket: close this container and let the parent continue
+            self.stack.pop()
+            return True
+        if frame["closer"] == "]":
+            return self.start_value(frame, ",]")
+        if char in "'\"":
+            self.open_string(":", None)
+            return True
+        match = self.BARE_KEY.match(self.text, self.pos)
+        if match and match.end() >= len(self.text):
+            return False
+        self.pos = match.end() if match else self.pos + 1
+        frame["key"] = match.group(0) if match else ""
+        frame["phase"] = "colon"
+        return True
+
+    def push(self, opener: str, answers=False, answer=None):
+        self.pos += 1
+        closer = "]" if opener == "[" else "}"
+        self.stack.append({
+            "closer": closer, "phase": "key", "key": None,
+            "answers": answers, "count": 0, "answer": answer,
+        })
+
+    def open_string(self, closers: str, steps_index):
+        self.pos += 1
+        self.string = {"quote": self.text[self.pos - 1], "closers": closers, "chars": [],
+                       "sent": 0, "steps_index": steps_index}
+
+    def start_value(self, frame: dict, closers: str):
+        char = self.text[self.pos]
+        index = frame["count"] if frame["answers"] else None
+        if char in "[{":
+            # Items of a top-level {"answers": [...]} list are answers too
+            wraps = char == "[" and len(self.stack) == 1 and frame["key"] == "answers"
+            self.push(char, answers=wraps, answer=index if char == "{" else None)
+        elif char in "'\"":
+            is_steps = frame["closer"] == "}" and frame["key"] == "steps"
+            self.open_string(closers, frame["answer"] if is_steps else None)
+        else:
+            end = self.SCALAR.match(self.text, self.pos).end()
+            if end >= len(self.text):
+                return False
+            self.pos = end
+        if frame["answers"]:
+            frame["count"] += 1
+        return True
+
+    def read_string(self):
+        string = self.string
+        text, pos, chars = self.text, self.pos, string["chars"]
+        while pos < len(text):
+            match = self.PLAIN.match(text, pos)
+            if match:
+                chars.append(match.group(0))
+                pos = match.end()
+                continue
+            char = text[pos]
+            if char == "\\":
+                if pos + 1 >= len(text):
+                    break
+                escaped = text[pos + 1]
+                if escaped == "u":
+                    digits = self.HEX.match(text, pos + 2).group(0)
+                    if len(digits) == 4:
+                        chars.append(chr(int(digits, 16)))
+                        pos += 6
+                        continue
+                    if pos + 2 + len(digits) >= len(text):
+                        break
+                chars.append(TolerantParser.ESCAPES.get(escaped, escaped))
+                pos += 2
+                continue
+            if char == string["quote"]:
+                closes = self.closes(pos + 1, string["closers"])
+                if closes is None:
+                    break
+                if closes:
+                    self.pos = pos + 1
+                    self.close_string()
+                    return True
+            chars.append(char)
+            pos += 1
+        self.pos = pos
+        return False
+
+    def close_string(self):
+        string, self.string = self.string, None
+        self.emit(string)
+        if string["closers"] == ":":
+            frame = self.stack[-1]
+            frame["key"] = "".join(string["chars"])
+            frame["phase"] = "colon"
+
+    def closes(self, pos: int, closers: str):
+        """TolerantParser.terminates, but None while the answer depends on text not received yet."""
+        pos = self.skip_ws(pos)
+        if pos >= len(self.text):
+            return None
+        char = self.text[pos]
+        if char == "," and "," in closers:
+            nxt = self.skip_ws(pos + 1)
+            if nxt >= len(self.text):
+                return None
+            allowed = "'\"}" if "}" in closers else "'\"{[]-0123456789tfnTFN"
+            return self.text[nxt] in allowed
+        if char in closers:
+            return True
+        if char in "'\"" and "}" in closers:
+            end = self.text.find(char, pos + 1)
+            after = self.skip_ws(end + 1) if end != -1 else len(self.text)
+            if after >= len(self.text):
+                return None
+            return self.text[after] == ":"
+        return False
@@ -0,0 +1,330 @@
+import asyncio
+import base64
+import functools
+import logging
+import threading
+import time
+from constants import (
+    GEMINI_API_KEY, MISTRAL_API_KEY, GEMINI_MAX_CONCURRENCY, MISTRAL_MAX_CONCURRENCY, PROVIDER_TIMEOUT,
+    STRUCTURED_OUTPUT, GEMINI_CONTEXT_CACHE, GEMINI_CONTEXT_CACHE_TTL,
+)
+from providers.health import CircuitBreaker, LatencyTracker
+from solution_cache import fingerprint
+from streaming import with_idle_timeout
+from token_usage import record_usage
+
+logger = logging.getLogger(__name__)
+
+API_KEYS = {
+    "mistral": MISTRAL_API_KEY,
+    "gemini": GEMINI_API_KEY,
+}
+
+
+# The SDKs take most of a second to import, so they are imported when a client is first
+# needed rather than with the app; warm_up() does it ahead of traffic
+def create_mistral(api_key: str):
+    from mistralai import Mistral
+    return Mistral(api_key=api_key)
+
+
+def create_gemini(api_key: str):
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+CLIENT_FACTORIES = {
+    "mistral": create_mistral,
+    "gemini": create_gemini,
+}
+
+# Filled in on first use. Benchmarks put stubs here beforehand, or None to switch a provider off
+clients = {}
+clients_lock = threading.Lock()
+semaphores = {
+    "mistral": asyncio.Semaphore(MISTRAL_MAX_CONCURRENCY),
+    "gemini": asyncio.Semaphore(GEMINI_MAX_CONCURRENCY),
+}
+
+
+def get_client(provider: str):
+    if provider in clients:
+        return clients[provider]
+    if not API_KEYS.get(provider):
+        return None
+    with clients_lock:
+        if provider not in clients:
+            clients[provider] = CLIENT_FACTORIES[provider](API_KEYS[provider])
+            logger.info("Created %s client", provider)
+    return clients[provider]
+
+
+def is_configured(provider: str):
+    if provider in clients:
+        return clients[provider] is not None
+    return bool(API_KEYS.get(provider))
+
+
+def warm_up():
+    """Create every configured client and import what the first request would otherwise pay for."""
+    for provider in CLIENT_FACTORIES:
+        get_client(provider)
+    if is_configured("gemini"):
+        answer_schema()
+
+
+# With JSON mode on, Mistral requires the prompt itself to ask for JSON
+JSON_INSTRUCTION = (
+    'Respond with a JSON object of the form {"answers": [...]} where every answer is an object '
+    'with the string fields "expr", "steps" and "result", the boolean field "assign" when a variable is assigned, '
+    'and the integer field "problem" holding the problem number when several numbered problems are given.'
+)
+
+
+@functools.cache
+def answer_schema():
+    from google.genai import types
+    return types.Schema(
+        type="ARRAY",
+        items=types.Schema(
+            type="OBJECT",
+            properties={
+                "expr": types.Schema(type="STRING"),
+                "steps": types.Schema(type="STRING"),
+                "result": types.Schema(type="STRING"),
+                "assign": types.Schema(type="BOOLEAN"),
+                # Only packed batch prompts ask for it, so it is optional
+                "problem": types.Schema(type="INTEGER"),
+            },
+            required=["expr", "steps", "result"],
+        ),
+    )
+
+
+class Prompt:
+    def __init__(self, system: str, user: str, image: bytes = None, mime_type: str = "image/png"):
+        self.system = system
+        self.user = user
+        self.image = image
+        self.mime_type = mime_type
+
+
+def is_rate_limit(e: Exception):
+    # mistralai errors carry status_code, google-genai errors carry code
+    return getattr(e, "status_code", None) == 429 or getattr(e, "code", None) == 429
+
+
+def is_context_cache_error(e: Exception):
+    # Gemini answers 404 or 403 naming the cachedContent resource when it expired early or was deleted
+    message = str(e).lower().replace(" ", "").replace("_", "")
+    return getattr(e, "code", None) in (403, 404) and "cachedcontent" in message
+
+
+class Backend:
+    provider = None
+
+    def __init__(self, model: str, tier: str = "standard"):
+        self.model = model
+        self.tier = tier
+        self.name = f"{self.provider}:{model}"
+        self.latency = LatencyTracker()
+        self.first_token = LatencyTracker()
+        self.breaker = CircuitBreaker()
+        self.stats = {"calls": 0, "failures": 0, "rate_limited": 0, "hedges_won": 0, "failovers_won": 0}
+
+    @property
+    def client(self):
+        client = get_client(self.provider)
+        if client is None:
+            raise RuntimeError(f"{self.provider} is not configured")
+        return client
+
+    def configured(self):
+        return is_configured(self.provider)
+
+    async def complete(self, prompt: Prompt):
+        raise NotImplementedError
+
+    async def stream(self, prompt: Prompt):
+        raise NotImplementedError
+        yield
+
+
+class MistralBackend(Backend):
+    provider = "mistral"
+
+    def messages(self, prompt: Prompt):
+        text = f"{prompt.user}\n{JSON_INSTRUCTION}" if STRUCTURED_OUTPUT else prompt.user
+        if prompt.image is not None:
+            data_url = f"data:{prompt.mime_type};base64,{base64.b64encode(prompt.image).decode('ascii')}"
+            content = [{"type": "text", "text": text}, {"type": "image_url", "image_url": data_url}]
+        else:
+            content = text
+        return [{"role": "system", "content": prompt.system}, {"role": "user", "content": content}]
+
+    def options(self, prompt: Prompt):
+        options = {"model": self.model, "messages": self.messages(prompt), "temperature": 0.3}
+        if STRUCTURED_OUTPUT:
+            options["response_format"] = {"type": "json_object"}
+        return options
+
+    def record_usage(self, usage):
+        if usage is not None:
+            record_usage(self.name, usage.prompt_tokens, 0, usage.completion_tokens)
+
+    async def complete(self, prompt: Prompt):
+        async with semaphores[self.provider]:
+            response = await asyncio.wait_for(
+                self.client.chat.complete_async(**self.options(prompt)),
+                timeout=PROVIDER_TIMEOUT
+            )
+        self.record_usage(getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    async def stream(self, prompt: Prompt):
+        usage = None
+        async with semaphores[self.provider]:
+            stream = await asyncio.wait_for(
+                self.client.chat.stream_async(**self.options(prompt)),
+                timeout=PROVIDER_TIMEOUT
+            )
+            async for event in with_idle_timeout(stream, PROVIDER_TIMEOUT):
+                usage = getattr(event.data, "usage", None) or usage
+                delta = event.data.choices[0].delta.content if event.data.choices else None
+                if isinstance(delta, str) and delta:
+                    yield delta
+        self.record_usage(usage)
+
+
+class GeminiBackend(Backend):
+    provider = "gemini"
+
+    def __init__(self, model: str, tier: str = "standard"):
+        super().__init__(model, tier)
+        # Cached content per system prompt, so the prompt tokens are not resent on every call
+        self.context_caches = {}
+        self.context_cache_lock = asyncio.Lock()
+        self.cache_deletions = set()
+
+    def live_context_cache(self, key: str):
+        entry = self.context_caches.get(key)
+        # Leave a minute of headroom so a request never races the cache expiring
+        if entry and entry["name"] and entry["expires_at"] > time.time() + 60:
+            return entry["name"]
+        return None
+
+    def forget_context_cache(self, key: str):
+        entry = self.context_caches.pop(key, None)
+        if entry and entry["name"]:
+            self.delete_context_cache(entry["name"])
+
+    def delete_context_cache(self, name: str):
+        # Cached content is billed until its TTL runs out, so a replaced one is deleted in the background
+        async def delete():
+            try:
+                await asyncio.wait_for(self.client.aio.caches.delete(name=name), timeout=PROVIDER_TIMEOUT)
+            except Exception as e:
+                logger.info("Could not delete Gemini context cache %s: %s", name, e)
+
+        task = asyncio.create_task(delete())
+        self.cache_deletions.add(task)
+        task.add_done_callback(self.cache_deletions.discard)
+
+    async def context_cache_name(self, system: str):
+        if not GEMINI_CONTEXT_CACHE:
+            return None
+        key = fingerprint(system)
+        entry = self.context_caches.get(key)
+        if self.live_context_cache(key) or (entry and entry["retry_at"] > time.time()):
+            return self.live_context_cache(key)
+        async with self.context_cache_lock:
+            entry = self.context_caches.get(key)
+            if self.live_context_cache(key) or (entry and entry["retry_at"] > time.time()):
+                return self.live_context_cache(key)
+            if entry and entry["name"]:
+                # About to expire; replace it instead of leaving it to run out
+                self.forget_context_cache(key)
+            from google.genai import types
+            try:
+                cached = await asyncio.wait_for(
+                    self.client.aio.caches.create(
+                        model=self.model,
+                        config=types.CreateCachedContentConfig(
+                            system_instruction=system,
+                            ttl=f"{GEMINI_CONTEXT_CACHE_TTL}s",
+                            display_name=f"intuitiq-{key}"
+                        )
+                    ),
+                    timeout=PROVIDER_TIMEOUT
+                )
+            except Exception as e:
+                # Usually the prompt is below the model's minimum cacheable size; send it inline instead
+                logger.info("Gemini context cache unavailable for %s, sending the prompt inline: %s", self.model, e)
+                self.context_caches[key] = {"name": None, "expires_at": 0.0, "retry_at": time.time() + GEMINI_CONTEXT_CACHE_TTL}
+                return None
+            self.context_caches[key] = {"name": cached.name, "expires_at": time.time() + GEMINI_CONTEXT_CACHE_TTL, "retry_at": 0.0}
+            logger.info("Created Gemini context cache %s for %s", cached.name, self.model)
+            return cached.name
+
+    def config(self, prompt: Prompt, cached_content: str = None):
+        from google.genai import types
+        options = {"response_modalities": ["Text"]}
+        if STRUCTURED_OUTPUT:
+            options["response_mime_type"] = "application/json"
+            options["response_schema"] = answer_schema()
+        if cached_content:
+            options["cached_content"] = cached_content
+        else:
+            options["system_instruction"] = prompt.system
+        return types.GenerateContentConfig(**options)
+
+    def contents(self, prompt: Prompt):
+        if prompt.image is None:
+            return [prompt.user]
+        from google.genai import types
+        return [prompt.user, types.Part.from_bytes(data=prompt.image, mime_type=prompt.mime_type)]
+
+    def record_usage(self, usage):
+        if usage is not None:
+            record_usage(self.name, usage.prompt_token_count, usage.cached_content_token_count, usage.candidates_token_count)
+
+    async def open_request(self, method, prompt: Prompt):
+        from google.genai import errors
+        cached_content = await self.context_cache_name(prompt.system)
+        try:
+            return await asyncio.wait_for(
+                method(model=self.model, contents=self.contents(prompt), config=self.config(prompt, cached_content)),
+                timeout=PROVIDER_TIMEOUT
+            )
+        except errors.APIError as e:
+            if not cached_content or not is_context_cache_error(e):
+                raise
+            # The cached content was deleted or expired early; fall back to the inline prompt
+            logger.warning("Gemini context cache %s rejected: %s", cached_content, e)
+            self.forget_context_cache(fingerprint(prompt.system))
+            return await asyncio.wait_for(
+                method(model=self.model, contents=self.contents(prompt), config=self.config(prompt)),
+                timeout=PROVIDER_TIMEOUT
+            )
+
+    async def complete(self, prompt: Prompt):
+        async with semaphores[self.provider]:
+            response = await self.open_request(self.client.aio.models.generate_content, prompt)
+        self.record_usage(getattr(response, "usage_metadata", None))
+        return response.text
+
+    async def stream(self, prompt: Prompt):
+        usage = None
+        async with semaphores[self.provider]:
+            stream = await self.open_request(self.client.aio.models.generate_content_stream, prompt)
+            async for chunk in with_idle_timeout(stream, PROVIDER_TIMEOUT):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.text:
+                    yield chunk.text
+        self.record_usage(usage)
+
+
+BACKEND_TYPES = {
+    "mistral": MistralBackend,
+    "gemini": GeminiBackend,
+}
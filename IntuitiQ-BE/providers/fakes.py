@@ -0,0 +1,66 @@
+"""Local stand-ins for real providers, with injectable latency and faults.
+
+Select them with e.g. ``TEXT_BACKENDS=fake:primary,fake:backup`` to run the
+server without API keys, or build a ProviderRouter from them directly as
+benchmarks/bench_router.py does.
+"""
+import asyncio
+import random
+from providers.backends import Backend, Prompt
+
+CANNED_ANSWER = "[{'expr': '2 + 3 * 4', 'steps': 'Step 1: 3 * 4 = 12\\nStep 2: 2 + 12 = 14', 'result': '14'}]"
+
+
+class FakeProviderError(Exception):
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeBackend(Backend):
+    provider = "fake"
+
+    def __init__(self, model: str, tier: str = "standard", latency=0.5, jitter=0.2, slow_rate=0.0, slow_factor=10.0,
+                 failure_rate=0.0, rate_limit_rate=0.0, canned=CANNED_ANSWER, chunks=10, seed=None):
+        super().__init__(model, tier)
+        self.latency_s = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.canned = canned
+        self.chunks = chunks
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    def configured(self):
+        return True
+
+    def delay(self):
+        delay = self.latency_s * (1 + self.random.uniform(-self.jitter, self.jitter))
+        if self.random.random() < self.slow_rate:
+            delay *= self.slow_factor
+        return delay
+
+    def maybe_fail(self):
+        if self.random.random() < self.rate_limit_rate:
+            raise FakeProviderError(f"{self.name} rate limited", status_code=429)
+        if self.random.random() < self.failure_rate:
+            raise FakeProviderError(f"{self.name} failed")
+
+    async def complete(self, prompt: Prompt):
+        self.requests += 1
+        await asyncio.sleep(self.delay())
+        self.maybe_fail()
+        return self.canned
+
+    async def stream(self, prompt: Prompt):
+        self.requests += 1
+        await asyncio.sleep(self.delay())
+        self.maybe_fail()
+        size = max(1, len(self.canned) // self.chunks)
+        for i in range(0, len(self.canned), size):
+            if i:
+                await asyncio.sleep(0.01)
+            yield self.canned[i:i + size]
@@ -0,0 +1,75 @@
+import time
+from collections import deque
+from constants import BREAKER_FAILURES, BREAKER_COOLDOWN, HEDGE_DELAY, HEDGE_MIN_DELAY, PROVIDER_TIMEOUT
+
+# Below this many samples a p95 is mostly noise, so hedging waits HEDGE_DELAY instead
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def hedge_delay(self):
+        if len(self.samples) < MIN_SAMPLES:
+            return HEDGE_DELAY
+        return min(max(self.percentile(95), HEDGE_MIN_DELAY), PROVIDER_TIMEOUT)
+
+
+class CircuitBreaker:
+    """Stops sending traffic to a backend after repeated failures.
+
+    After ``failures`` consecutive errors the breaker opens for ``cooldown``
+    seconds. Then a single trial request is let through: success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def available(self):
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial)
+
+    def acquire(self):
+        if not self.available():
+            return False
+        if self.state == "half_open":
+            self.trial = True
+        return True
+
+    def release(self):
+        # A cancelled trial (e.g. the losing side of a hedge) proves nothing either way
+        self.trial = False
+
+    def record_success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self):
+        self.consecutive += 1
+        if self.trial or self.consecutive >= self.failures:
+            self.opened_at = time.monotonic()
+        self.trial = False
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import random
+import time
+from constants import (
+    TEXT_BACKENDS, TEXT_CHEAP_BACKENDS, IMAGE_BACKENDS, IMAGE_CHEAP_BACKENDS, STRUCTURED_OUTPUT,
+    HEDGE_ENABLED, HEDGE_BUDGET, RETRY_ATTEMPTS, RETRY_BASE_DELAY,
+)
+from providers.backends import BACKEND_TYPES, JSON_INSTRUCTION, Prompt, is_rate_limit
+from metrics import Collected, provider_calls_in_flight, provider_first_token_seconds, provider_request_seconds
+from providers.fakes import FakeBackend
+
+logger = logging.getLogger(__name__)
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+# Routers made by create_router, which /metrics reports on
+routers = []
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+def backoff(attempt: int):
+    # Full jitter keeps clients that were rate-limited together from retrying together
+    return random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+
+
+class ProviderRouter:
+    """Sends each request to the best available backend for a modality.
+
+    Backends are tried in configured order, skipping those whose circuit
+    breaker is open. If the first backend has not answered within its p95
+    latency, a second one is started and the first answer wins. A failed
+    backend fails over to the next one; 429s are retried with jittered
+    backoff on the same backend first.
+    """
+
+    def __init__(self, modality: str, backends: list, hedging: bool = HEDGE_ENABLED):
+        self.modality = modality
+        self.backends = backends
+        self.hedging = hedging
+        self.stats = {"requests": 0, "hedged": 0, "failovers": 0, "rejected": 0}
+
+    def fingerprint(self):
+        return (",".join(backend.name for backend in self.backends), STRUCTURED_OUTPUT and JSON_INSTRUCTION)
+
+    def candidates(self, tier: str):
+        preferred = [backend for backend in self.backends if backend.tier == tier]
+        fallback = [backend for backend in self.backends if backend.tier != tier]
+        return [backend for backend in preferred + fallback if backend.configured() and backend.breaker.available()]
+
+    def can_hedge(self):
+        return self.hedging and self.stats["hedged"] < HEDGE_BUDGET * self.stats["requests"] + 1
+
+    async def with_retries(self, backend, call):
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            try:
+                return await call()
+            except asyncio.CancelledError:
+                backend.breaker.release()
+                raise
+            except Exception as e:
+                if is_rate_limit(e) and attempt < RETRY_ATTEMPTS:
+                    backend.stats["rate_limited"] += 1
+                    await asyncio.sleep(backoff(attempt))
+                    continue
+                backend.stats["failures"] += 1
+                backend.breaker.record_failure()
+                logger.warning("%s backend %s failed: %r", self.modality, backend.name, e)
+                raise
+
+    async def race(self, tier: str, start, hedge_delay, discard=None):
+        """Run ``start(backend)`` on the best backend, hedging and failing over; returns (backend, result)."""
+        queue = self.candidates(tier)
+        running = {}
+        errors = []
+        hedged = False
+        self.stats["requests"] += 1
+
+        def launch():
+            while queue:
+                backend = queue.pop(0)
+                if backend.breaker.acquire():
+                    backend.stats["calls"] += 1
+                    running[asyncio.create_task(start(backend))] = backend
+                    return True
+            return False
+
+        if not launch():
+            self.stats["rejected"] += 1
+            raise NoBackendAvailable(f"No {self.modality} provider is available right now")
+        first = next(iter(running.values()))
+        winner = None
+        try:
+            while running:
+                delay = None
+                if not hedged and queue and self.can_hedge():
+                    delay = hedge_delay(next(iter(running.values())))
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch():
+                        self.stats["hedged"] += 1
+                    continue
+                for task in done:
+                    backend = running.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif winner is None:
+                        winner = (backend, task.result())
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    if winner[0] is not first:
+                        winner[0].stats["hedges_won" if hedged else "failovers_won"] += 1
+                    return winner
+                if not running and launch():
+                    self.stats["failovers"] += 1
+        finally:
+            for task in running:
+                task.cancel()
+                # A loser can still fail before the cancellation lands; nobody awaits it any more
+                task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        raise errors[-1]
+
+    async def complete(self, prompt: Prompt, tier: str = "standard"):
+        async def start(backend):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                with provider_calls_in_flight.in_progress(backend=backend.name):
+                    text = await self.with_retries(backend, lambda: backend.complete(prompt))
+                outcome = "ok"
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                provider_request_seconds.observe(time.perf_counter() - started, backend=backend.name, outcome=outcome)
+            backend.latency.add(time.perf_counter() - started)
+            backend.breaker.record_success()
+            return text
+
+        _, text = await self.race(tier, start, lambda backend: backend.latency.hedge_delay())
+        return text
+
+    async def stream(self, prompt: Prompt, tier: str = "standard"):
+        async def start(backend):
+            async def first_chunk():
+                chunks = backend.stream(prompt)
+                try:
+                    return await chunks.__anext__(), chunks
+                except StopAsyncIteration:
+                    return "", chunks
+                except BaseException:
+                    await chunks.aclose()
+                    raise
+
+            started = time.perf_counter()
+            opened = await self.with_retries(backend, first_chunk)
+            backend.first_token.add(time.perf_counter() - started)
+            provider_first_token_seconds.observe(time.perf_counter() - started, backend=backend.name)
+            return opened
+
+        async def discard(opened):
+            await opened[1].aclose()
+
+        backend, (first, chunks) = await self.race(
+            tier, start, lambda backend: backend.first_token.hedge_delay(), discard
+        )
+        # Tokens have reached the client by now, so a failure mid-stream cannot fail over
+        provider_calls_in_flight.inc(backend=backend.name)
+        try:
+            if first:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        except asyncio.CancelledError:
+            backend.breaker.release()
+            raise
+        except Exception:
+            backend.stats["failures"] += 1
+            backend.breaker.record_failure()
+            raise
+        finally:
+            provider_calls_in_flight.dec(backend=backend.name)
+            await chunks.aclose()
+        backend.breaker.record_success()
+
+def parse_backends(spec: str, tier: str):
+    backends = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        provider, _, model = item.partition(":")
+        if provider == "fake":
+            backends.append(FakeBackend(model or "fake", tier))
+        elif provider in BACKEND_TYPES:
+            backends.append(BACKEND_TYPES[provider](model, tier))
+        else:
+            logger.warning("Ignoring unknown provider backend %r", item)
+    return backends
+
+
+def create_router(modality: str):
+    if modality == "text":
+        backends = parse_backends(TEXT_BACKENDS, "standard") + parse_backends(TEXT_CHEAP_BACKENDS, "cheap")
+    else:
+        backends = parse_backends(IMAGE_BACKENDS, "standard") + parse_backends(IMAGE_CHEAP_BACKENDS, "cheap")
+    router = ProviderRouter(modality, backends)
+    routers.append(router)
+    return router
+
+
+Collected("intuitiq_router_requests_total", "Provider router requests, hedges, failovers and rejections.", "counter", ("modality", "kind"), lambda: [
+    ({"modality": router.modality, "kind": kind}, count) for router in routers for kind, count in router.stats.items()
+])
+Collected("intuitiq_backend_calls_total", "Backend calls, failures, rate limits and hedge or failover wins.", "counter", ("modality", "backend", "kind"), lambda: [
+    ({"modality": router.modality, "backend": backend.name, "kind": kind}, count)
+    for router in routers for backend in router.backends for kind, count in backend.stats.items()
+])
+Collected("intuitiq_backend_breaker_state", "Circuit breaker state: 0 closed, 1 half open, 2 open.", "gauge", ("modality", "backend"), lambda: [
+    ({"modality": router.modality, "backend": backend.name}, BREAKER_STATES[backend.breaker.state])
+    for router in routers for backend in router.backends
+])
@@ -0,0 +1,99 @@
+import asyncio
+import copy
+from metrics import Collected
+
+# Result a leader publishes when it gave up without an answer; followers then solve on their own
+ABANDONED = object()
+
+flight_groups = []
+
+
+class SingleFlight:
+    """Lets concurrent identical solves share one provider call.
+
+    The first caller for a key becomes the leader and does the work. Callers
+    that arrive while it is in flight wait for the leader's result and get
+    their own copy of it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+        flight_groups.append(self)
+
+    def pending(self, key: str):
+        return self.calls.get(key)
+
+    def claim(self, key: str):
+        future = asyncio.get_running_loop().create_future()
+        self.calls[key] = future
+        self.stats["leaders"] += 1
+        return future
+
+    def settle(self, key: str, future, result=ABANDONED, error: BaseException = None):
+        if self.calls.get(key) is future:
+            del self.calls[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Mark it retrieved so a leader with no followers does not log "exception never retrieved"
+            future.exception()
+            return
+        if result is ABANDONED:
+            self.stats["abandoned"] += 1
+        future.set_result(result)
+
+    async def wait(self, future):
+        self.stats["coalesced"] += 1
+        result = await asyncio.shield(future)
+        return result if result is ABANDONED else copy.deepcopy(result)
+
+    async def run(self, key: str, solve):
+        while (future := self.pending(key)) is not None:
+            result = await self.wait(future)
+            if result is not ABANDONED:
+                return result
+        future = self.claim(key)
+        # The work runs as its own task so a disconnecting leader does not cancel it for everyone else
+        task = asyncio.create_task(solve())
+
+        def done(task):
+            if task.cancelled():
+                self.settle(key, future)
+            elif task.exception() is not None:
+                self.settle(key, future, error=task.exception())
+            else:
+                self.settle(key, future, task.result())
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, start):
+        """Streaming counterpart of run for async generators of (kind, payload) events.
+
+        The leader relays every event of ``start()`` and publishes the payload of
+        its "result" event. Followers yield only ("result", answers).
+        """
+        while (future := self.pending(key)) is not None:
+            result = await self.wait(future)
+            if result is not ABANDONED:
+                yield "result", result
+                return
+        future = self.claim(key)
+        try:
+            async for kind, payload in start():
+                if kind == "result":
+                    self.settle(key, future, payload)
+                yield kind, payload
+        finally:
+            self.settle(key, future)
+
+
+Collected("intuitiq_coalescing_total", "Single-flight leaders, coalesced followers and abandoned flights.", "counter", ("modality", "kind"), lambda: [
+    ({"modality": group.name, "kind": kind}, count) for group in flight_groups for kind, count in group.stats.items()
+])
+Collected("intuitiq_solves_in_flight", "Distinct provider solves currently in flight.", "gauge", ("modality",), lambda: [
+    ({"modality": group.name}, len(group.calls)) for group in flight_groups
+])
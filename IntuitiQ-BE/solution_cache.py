@@ -0,0 +1,192 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from PIL import Image
+from constants import SOLUTION_CACHE_SIZE, SOLUTION_CACHE_TTL, SOLUTION_CACHE_PATH
+from metrics import Collected
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def normalize_question(question: str):
+    text = unicodedata.normalize("NFKC", question).strip()
+    text = re.sub(r"\s+", " ", text)
+    return re.sub(r"\s*([^\w\s])\s*", r"\1", text)
+
+
+def canonical_vars(dict_of_vars: dict):
+    return json.dumps(dict_of_vars or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def text_key(question: str):
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+def image_key(img: Image.Image, dict_of_vars: dict):
+    rgba = img.convert("RGBA")
+    bbox = rgba.getchannel("A").getbbox()
+    if bbox is None or bbox == (0, 0) + rgba.size:
+        bbox = rgba.convert("RGB").getbbox() or bbox
+    if bbox:
+        rgba = rgba.crop(bbox)
+    digest = hashlib.sha256()
+    digest.update(f"{rgba.size[0]}x{rgba.size[1]}".encode("ascii"))
+    digest.update(rgba.tobytes())
+    digest.update(canonical_vars(dict_of_vars).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteBackend:
+    # Several workers may share the file; a write that cannot get the lock quickly is dropped
+    LOCK_TIMEOUT = 0.25
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.LOCK_TIMEOUT, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self.connect().execute(
+            "SELECT value FROM solutions WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO solutions (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + self.ttl),
+            )
+
+    def clear(self, prefix: str):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM solutions WHERE key LIKE ? OR expires_at < ?", (prefix + ":%", time.time()))
+
+
+_backend = SQLiteBackend(SOLUTION_CACHE_PATH, SOLUTION_CACHE_TTL) if SOLUTION_CACHE_PATH else None
+
+caches = []
+
+
+class SolutionCache:
+    def __init__(self, namespace: str, version: str, maxsize=SOLUTION_CACHE_SIZE, ttl=SOLUTION_CACHE_TTL, backend=_backend):
+        self.namespace = namespace
+        self.version = version
+        self.memory = LRUCache(maxsize, ttl)
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        caches.append(self)
+
+    def full_key(self, key: str):
+        return f"{self.namespace}:{self.version}:{key}"
+
+    async def get(self, key: str):
+        full_key = self.full_key(key)
+        value = self.memory.get(full_key)
+        if value is None and self.backend is not None:
+            try:
+                value = await asyncio.to_thread(self.backend.get, full_key)
+            except sqlite3.Error as e:
+                logger.warning("Solution cache read failed: %s", e)
+            if value is not None:
+                self.memory.set(full_key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value):
+        full_key = self.full_key(key)
+        value = copy.deepcopy(value)
+        self.memory.set(full_key, value)
+        if self.backend is not None:
+            # Written from a worker thread so the response never waits on disk or the file lock
+            asyncio.get_running_loop().run_in_executor(None, self.write_through, full_key, value)
+
+    def write_through(self, full_key: str, value):
+        try:
+            self.backend.set(full_key, value)
+        except sqlite3.Error as e:
+            logger.warning("Solution cache write failed: %s", e)
+
+    def invalidate(self, version: str = None):
+        self.memory.clear()
+        if self.backend is not None:
+            try:
+                self.backend.clear(self.namespace)
+            except sqlite3.Error as e:
+                logger.warning("Solution cache clear failed: %s", e)
+        if version is not None:
+            self.version = version
+
+
+
+Collected("intuitiq_solution_cache_lookups_total", "Solution cache lookups by result.", "counter", ("cache", "result"), lambda: [
+    ({"cache": cache.namespace, "result": result}, count)
+    for cache in caches for result, count in (("hit", cache.hits), ("miss", cache.misses))
+])
+Collected("intuitiq_solution_cache_entries", "Entries held in the in-memory solution cache.", "gauge", ("cache",), lambda: [
+    ({"cache": cache.namespace}, len(cache.memory.entries)) for cache in caches
+])
@@ -0,0 +1,23 @@
+import logging
+from metrics import Collected
+
+logger = logging.getLogger(__name__)
+
+token_stats = {}
+Collected("intuitiq_provider_tokens_total", "Provider tokens by backend and kind.", "counter", ("backend", "kind"), lambda: [
+    ({"backend": backend, "kind": kind}, stats[f"{kind}_tokens"])
+    for backend, stats in token_stats.items() for kind in ("input", "cached_input", "output")
+])
+
+
+def record_usage(provider: str, input_tokens, cached_tokens=0, output_tokens=0):
+    input_tokens = input_tokens or 0
+    cached_tokens = cached_tokens or 0
+    output_tokens = output_tokens or 0
+    stats = token_stats.setdefault(provider, {"requests": 0, "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0})
+    stats["requests"] += 1
+    stats["input_tokens"] += input_tokens
+    stats["cached_input_tokens"] += cached_tokens
+    stats["output_tokens"] += output_tokens
+    logger.info("%s tokens: input=%d cached=%d output=%d", provider, input_tokens, cached_tokens, output_tokens)
+
@@ -9,9 +9,11 @@ interface HistoryEntry {
     _id: string;
     input: string;
     output: string;
-    image: string;
+    image_url: string;
+    thumbnail_url?: string;
     responses: any[];
     date: string;
+    created_at?: string;
     type: "text" | "image";
 }
 
@@ -37,6 +39,9 @@ export default function History() {
     const [filter, setFilter] = useState<"all" | "text" | "image">("all");
     const [deleteModalOpen, setDeleteModalOpen] = useState(false);
     const [isDeleting, setIsDeleting] = useState(false);
+    const [textCursor, setTextCursor] = useState<string | null>(null);
+    const [imageCursor, setImageCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const { width } = useWindowSize();
     const isWidth = width < 769;
     const getButtonSizeClass = (width: number) => {
@@ -45,34 +50,38 @@ export default function History() {
     };
     const buttonSizeClass = getButtonSizeClass(width);
 
+    // Entries are ordered the way the server pages them; records saved before created_at existed sort last
+    const createdAt = (entry: HistoryEntry) => entry.created_at ? new Date(entry.created_at).getTime() : 0;
+
+    const sortByDate = (entries: HistoryEntry[]) => entries.sort((a, b) => createdAt(b) - createdAt(a));
+
+    // Text and image history are paged by separate cursors; a null cursor means that list is exhausted
+    const fetchPage = async (type: "text" | "image", cursor?: string) => {
+        try {
+            const response = await axios.get(`${import.meta.env.VITE_API_URL}/${type}_history`, {
+                params: { user_id: user?.id, ...(cursor ? { cursor } : {}) }
+            });
+            return {
+                entries: response.data.history.map((entry: any) => ({ ...entry, type })),
+                next: response.data.next_cursor ?? null
+            };
+        } catch (err) {
+            console.error(`Failed to fetch ${type} history:`, err);
+            // Keep the cursor so "Load More" can retry the same page
+            return { entries: [], next: cursor ?? null };
+        }
+    };
+
     useEffect(() => {
         if (!user) return;
         const fetchHistory = async () => {
             try {
-                let textHistory = [];
-                let imageHistory = [];
-                try {
-                    const textResponse = await axios.get(`${import.meta.env.VITE_API_URL}/text_history`, { params: { user_id: user.id } });
-                    textHistory = textResponse.data.history.map((entry: any) => ({ ...entry, type: "text" }));
-                } catch (textErr) {
-                    console.error("Failed to fetch text history:", textErr);
-                }
-                try {
-                    const imageResponse = await axios.get(`${import.meta.env.VITE_API_URL}/image_history`, { params: { user_id: user.id } });
-                    imageHistory = imageResponse.data.history.map((entry: any) => ({ ...entry, type: "image" }));
-                } catch (imageErr) {
-                    console.error("Failed to fetch image history:", imageErr);
-                }
-                const combinedHistory = [...textHistory, ...imageHistory];
+                const [textPage, imagePage] = await Promise.all([fetchPage("text"), fetchPage("image")]);
+                setTextCursor(textPage.next);
+                setImageCursor(imagePage.next);
+                const combinedHistory = [...textPage.entries, ...imagePage.entries];
                 if (combinedHistory.length === 0) setError(null);
-                else {
-                    const sortedHistory = combinedHistory.sort((a, b) => {
-                        const dateA = new Date(a.date.replace(/(\d{2})\/(\d{2})\/(\d{4}) (\d{2}:\d{2}:\d{2})/, "$3-$2-$1T$4"));
-                        const dateB = new Date(b.date.replace(/(\d{2})\/(\d{2})\/(\d{4}) (\d{2}:\d{2}:\d{2})/, "$3-$2-$1T$4"));
-                        return dateB.getTime() - dateA.getTime();
-                    });
-                    setHistory(sortedHistory);
-                }
+                else setHistory(sortByDate(combinedHistory));
             } catch (err) {
                 setError("Failed to fetch history");
             } finally {
@@ -82,6 +91,21 @@ export default function History() {
         fetchHistory();
     }, [user]);
 
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const [textPage, imagePage] = await Promise.all([
+                textCursor ? fetchPage("text", textCursor) : { entries: [], next: null },
+                imageCursor ? fetchPage("image", imageCursor) : { entries: [], next: null }
+            ]);
+            setTextCursor(textPage.next);
+            setImageCursor(imagePage.next);
+            setHistory((current) => sortByDate([...current, ...textPage.entries, ...imagePage.entries]));
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleCopy = (text: string, id: string) => {
         navigator.clipboard.writeText(text);
         setCopiedId(id);
@@ -108,6 +132,8 @@ export default function History() {
             await axios.delete(`${import.meta.env.VITE_API_URL}/text_history/user/${user.id}`);
             await axios.delete(`${import.meta.env.VITE_API_URL}/image_history/user/${user.id}`);
             setHistory([]);
+            setTextCursor(null);
+            setImageCursor(null);
             setError(null);
         } catch (err) {
             console.error("Failed to delete all history:", err);
@@ -118,8 +144,16 @@ export default function History() {
         }
     };
 
+    // Unloaded pages of a list may interleave with anything older than its oldest loaded entry,
+    // so "All" shows entries only down to the newer of the two lists' oldest loaded entries
+    const oldestLoaded = (type: "text" | "image", cursor: string | null) => {
+        const loaded = history.filter((entry) => entry.type === type).map(createdAt);
+        return cursor && loaded.length > 0 ? Math.min(...loaded) : -Infinity;
+    };
+    const shownDownTo = Math.max(oldestLoaded("text", textCursor), oldestLoaded("image", imageCursor));
+
     const filteredHistory = history.filter((entry) => {
-        if (filter === "all") return true;
+        if (filter === "all") return createdAt(entry) >= shownDownTo;
         return entry.type === filter;
     });
 
@@ -229,13 +263,13 @@ export default function History() {
                                         className={`grid grid-cols-7 text-white text-center mt-2 py-2 px-3 bg-gray-800 rounded-lg cursor-pointer hover:bg-gray-700`}
                                     >
                                         <div className={`${width < 769 ? 'text-xs' : ''} col-span-2 px-2 ${entry.type === "text" ? "truncate" : "flex items-center justify-center"}`}>
-                                            {entry.type === "text" ? entry.input : (
+                                            {entry.type === "text" ? entry.input : entry.thumbnail_url ? (
                                                 <img
-                                                    src={entry.image}
+                                                    src={`${import.meta.env.VITE_API_URL}${entry.thumbnail_url}`}
                                                     alt="Processed Input Image"
                                                     className={`${width < 769 ? 'w-40 h-20' : 'w-60 h-30'} object-cover rounded-lg`}
                                                 />
-                                            )}
+                                            ) : "Image unavailable"}
                                         </div>
                                         <div className={`${width < 769 ? 'text-xs' : ''} col-span-2 px-2 ${entry.type === "text" ? "truncate" : "flex items-center justify-center"}`}>
                                             {entry.type === "text"
@@ -267,6 +301,17 @@ export default function History() {
                                 ))}
                             </div>
                         )}
+                        {(textCursor || imageCursor) && (
+                            <div className="flex justify-center mt-4">
+                                <button
+                                    onClick={handleLoadMore}
+                                    disabled={loadingMore}
+                                    className={`${buttonSizeClass} rounded-lg bg-indigo-600 text-white hover:bg-indigo-700 disabled:bg-indigo-800 disabled:cursor-not-allowed`}
+                                >
+                                    {loadingMore ? "Loading..." : "Load More"}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 )}
             </div>